@@ -0,0 +1,65 @@
+import asyncio
+import io
+import os
+
+import discord
+from discord.oggparse import OggStream
+
+# Banco de audios propios de la emisora (himno, cuñas) residentes en memoria.
+# Cada archivo se decodifica UNA vez al arrancar (ffmpeg -> Opus) y se guarda como lista de
+# paquetes Opus de 20 ms. Reproducirlo es recorrer esa lista: sin lanzar ffmpeg, sin tocar
+# el disco y con el primer frame disponible en el mismo instante de vc.play().
+
+
+class MemorySource(discord.AudioSource):
+    def __init__(self, packets):
+        self.packets = packets  # Compartida entre reproducciones, solo lectura
+        self.index = 0
+
+    def is_opus(self):
+        return True
+
+    def read(self):
+        if self.index >= len(self.packets): return b""
+        packet = self.packets[self.index]
+        self.index += 1
+        return packet
+
+
+class AssetBank:
+    def __init__(self, bitrate=128):
+        self.bitrate = bitrate
+        self.assets = {}  # ruta -> {"packets", "mtime", "gain"}
+
+    def __contains__(self, path):
+        return path in self.assets
+
+    def total_bytes(self):
+        return sum(len(p) for entry in self.assets.values() for p in entry["packets"])
+
+    def is_fresh(self, path, gain=None):
+        entry = self.assets.get(path)
+        return bool(entry) and entry["gain"] == gain and entry["mtime"] == os.path.getmtime(path)
+
+    async def load(self, path, gain=None):
+        # Decodifica `path` a paquetes Opus (con la ganancia de sonoridad ya aplicada). True si quedó cargado.
+        if not os.path.exists(path): return False
+        if self.is_fresh(path, gain): return True
+        args = ["ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "warning", "-i", path, "-vn", "-map_metadata", "-1"]
+        if gain: args += ["-af", f"volume={gain:.2f}dB"]
+        args += ["-f", "opus", "-c:a", "libopus", "-ar", "48000", "-ac", "2", "-b:a", f"{self.bitrate}k", "pipe:1"]
+        proc = await asyncio.create_subprocess_exec(*args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        data, stderr = await proc.communicate()
+        if proc.returncode != 0 or not data:
+            print(f"⚠️ Banco de audio: no se pudo decodificar {path} ({stderr.decode(errors='replace').strip()[-200:]})")
+            return False
+        # Fuera las cabeceras del Ogg (OpusHead/OpusTags): solo quedan paquetes de audio
+        packets = [p for p in OggStream(io.BytesIO(data)).iter_packets() if not p.startswith((b"OpusHead", b"OpusTags"))]
+        self.assets[path] = {"packets": packets, "mtime": os.path.getmtime(path), "gain": gain}
+        print(f"🗃️ Banco de audio: {path} ({len(packets) * 0.02:.1f}s, {len(data) / 1024:.0f} KB)")
+        return True
+
+    def source(self, path):
+        # MemorySource lista para vc.play(), o None si el archivo no está en el banco
+        entry = self.assets.get(path)
+        return MemorySource(entry["packets"]) if entry else None
@@ -0,0 +1,109 @@
+import asyncio
+import json
+import os
+import time
+
+# Caché local de canciones ya transcodificadas a Opus/Ogg.
+# index.json: video_id -> {"file", "size", "title", "last_used"}; se expulsa por LRU
+# cuando el total supera el presupuesto de bytes.
+
+
+class AudioCache:
+    def __init__(self, directory="audio_cache", max_bytes=2 * 1024**3, bitrate="96k"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.bitrate = bitrate
+        self.index_path = os.path.join(directory, "index.json")
+        self.index = {}
+        self.dirty = False
+        self.downloading = set()
+        os.makedirs(directory, exist_ok=True)
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, "r") as f:
+                    self.index = json.load(f)
+            except Exception as e:
+                print(f"⚠️ Índice de la caché de audio ilegible ({e}). Empezando vacía.")
+        # Entradas cuyo archivo ya no existe (disco efímero, borrado manual...)
+        for vid in [v for v, e in self.index.items() if not os.path.exists(self._path(e["file"]))]:
+            del self.index[vid]
+            self.dirty = True
+        print(f"💽 Caché de audio: {len(self.index)} pistas, {self.total_bytes() / 1024**2:.0f} MB.")
+
+    def save(self):
+        if not self.dirty: return
+        tmp = f"{self.index_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.index, f)
+        os.replace(tmp, self.index_path)
+        self.dirty = False
+
+    def _path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    def total_bytes(self):
+        return sum(e["size"] for e in self.index.values())
+
+    def is_full(self):
+        return self.total_bytes() >= self.max_bytes
+
+    def __contains__(self, video_id):
+        return video_id in self.index
+
+    def get(self, video_id):
+        # Devuelve (ruta, título) y marca la pista como usada, o None
+        entry = self.index.get(video_id)
+        if not entry: return None
+        path = self._path(entry["file"])
+        if not os.path.exists(path):
+            del self.index[video_id]
+            self.dirty = True
+            return None
+        entry["last_used"] = time.time()
+        self.dirty = True
+        return path, entry.get("title")
+
+    def evict(self, needed=0):
+        # LRU: fuera las menos usadas hasta que quepan `needed` bytes más
+        for vid, entry in sorted(self.index.items(), key=lambda kv: kv[1]["last_used"]):
+            if self.total_bytes() + needed <= self.max_bytes: break
+            try: os.remove(self._path(entry["file"]))
+            except FileNotFoundError: pass
+            del self.index[vid]
+            self.dirty = True
+            print(f"🧹 Caché de audio: expulsado {vid}")
+
+    async def download(self, video_id, stream_url, title=None):
+        if video_id in self.index or video_id in self.downloading: return None
+        self.downloading.add(video_id)
+        filename = f"{video_id}.ogg"
+        tmp = self._path(f"{video_id}.part.ogg")
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                "ffmpeg", "-nostdin", "-loglevel", "error", "-y",
+                "-reconnect", "1", "-reconnect_streamed", "1", "-reconnect_delay_max", "5",
+                "-i", stream_url, "-vn", "-c:a", "libopus", "-b:a", self.bitrate, tmp,
+                stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+            )
+            try:
+                _, err = await proc.communicate()
+            except asyncio.CancelledError:
+                proc.kill()
+                raise
+            if proc.returncode != 0:
+                print(f"❌ Caché de audio: ffmpeg falló para {video_id}: {err.decode(errors='ignore')[-200:]}")
+                return None
+            size = os.path.getsize(tmp)
+            self.evict(needed=size)
+            os.replace(tmp, self._path(filename))
+            self.index[video_id] = {"file": filename, "size": size, "title": title, "last_used": time.time()}
+            self.dirty = True
+            self.save()
+            print(f"💽 Caché de audio: guardado {video_id} ({size / 1024**2:.1f} MB)")
+            return self._path(filename)
+        finally:
+            self.downloading.discard(video_id)
+            if os.path.exists(tmp): os.remove(tmp)
@@ -0,0 +1,345 @@
+import math
+import threading
+import time
+from array import array
+from collections import deque
+
+import discord
+from discord import opus
+
+# AudioSources propios del bot (envoltorios sobre los FFmpeg* de discord.py).
+
+FRAME_SECONDS = opus.Encoder.FRAME_LENGTH / 1000
+PCM_SILENCE = b"\x00" * opus.Encoder.FRAME_SIZE
+OPUS_SILENCE = b"\xf8\xff\xfe"
+
+
+def mix_pcm(a, b, gain_a, gain_b):
+    # Mezcla dos frames PCM s16le con ganancias (para el crossfade)
+    x, y = array("h", a), array("h", b)
+    if len(y) < len(x): y.extend([0] * (len(x) - len(y)))
+    mixed = array("h", (max(-32768, min(32767, int(p * gain_a + q * gain_b))) for p, q in zip(x, y)))
+    return mixed.tobytes()
+
+
+class PrebufferedSource(discord.AudioSource):
+    # Arranca la lectura de la fuente en segundo plano (ffmpeg ya lanzado, conexión HTTP
+    # abierta, primeros frames en memoria) para que el primer read() sea inmediato.
+    def __init__(self, source, frames=50):
+        self.source = source
+        self.buffer = deque()
+        self.cond = threading.Condition()
+        self.filling = True
+        self.ended = False
+        threading.Thread(target=self._fill, args=(frames,), daemon=True).start()
+
+    def _fill(self, frames):
+        try:
+            for _ in range(frames):
+                data = self.source.read()
+                with self.cond:
+                    if not data:
+                        self.ended = True
+                        break
+                    self.buffer.append(data)
+                    self.cond.notify_all()
+        except Exception as e:
+            print(f"❌ Pre-buffer falló: {e}")
+            self.ended = True
+        finally:
+            with self.cond:
+                self.filling = False
+                self.cond.notify_all()
+
+    def is_opus(self):
+        return self.source.is_opus()
+
+    def read(self):
+        with self.cond:
+            while not self.buffer and self.filling:
+                self.cond.wait()
+            if self.buffer: return self.buffer.popleft()
+            if self.ended: return b""
+        return self.source.read()
+
+    def cleanup(self):
+        self.source.cleanup()
+
+
+class GaplessChain(discord.AudioSource):
+    # Una sola fuente larga para el VoiceClient: cuando una pista termina, la siguiente
+    # (ya pre-bufferizada) empieza en el mismo frame. Pide la siguiente pista con
+    # `lead` segundos de antelación si conoce la duración, o nada más empezar si no.
+    # Cada pista lleva un `tag` opaco que vuelve en on_track_start(título, tag) y on_track_end(tag).
+    def __init__(self, loop, on_need_next, on_track_start=None, on_gap=None, on_track_end=None,
+                 is_opus=False, lead=15, crossfade=0, prebuffer_frames=50):
+        self.loop = loop
+        self.on_need_next = on_need_next
+        self.on_track_start = on_track_start
+        self.on_track_end = on_track_end
+        self.on_gap = on_gap
+        self.opus = is_opus
+        self.lead_frames = int(lead / FRAME_SECONDS)
+        self.fade_frames = int(crossfade / FRAME_SECONDS) if not is_opus else 0  # Opus no se puede mezclar
+        self.prebuffer_frames = prebuffer_frames
+        self.lock = threading.Lock()
+        self.current = None
+        self.current_tag = None
+        self.current_frames = None   # Duración de la pista actual en frames (None = desconocida)
+        self.played = 0
+        self.upcoming = deque()      # (source, title, frames, tag)
+        self.requested = False
+        self.skipping = False
+        self.gap_started = None
+
+    def is_opus(self):
+        return self.opus
+
+    def push(self, source, title=None, duration=None, tag=None):
+        frames = int(duration / FRAME_SECONDS) if duration else None
+        prebuffered = PrebufferedSource(source, self.prebuffer_frames)
+        with self.lock:
+            self.upcoming.append((prebuffered, title, frames, tag))
+            self.requested = False
+
+    def skip(self):
+        # Salta la pista actual sin parar el reproductor: la siguiente (ya pre-bufferizada) entra en el próximo frame
+        self.skipping = True
+
+    def take_upcoming(self):
+        # Saca las pistas encoladas que aún no han sonado (para devolverlas a la cola) y devuelve sus tags
+        with self.lock:
+            pending = list(self.upcoming)
+            self.upcoming.clear()
+        for source, _, _, _ in pending: source.cleanup()
+        return [tag for _, _, _, tag in pending]
+
+    def _notify(self, callback, *args):
+        if callback: self.loop.call_soon_threadsafe(callback, *args)
+
+    def _advance(self):
+        # Siguiente pista (si hay). Devuelve False si toca esperar.
+        if self.current:
+            self.current.cleanup()
+            self._notify(self.on_track_end, self.current_tag)
+        self.current = None
+        with self.lock:
+            if not self.upcoming: return False
+            self.current, title, self.current_frames, self.current_tag = self.upcoming.popleft()
+        self.played = 0
+        self._notify(self.on_track_start, title, self.current_tag)
+        return True
+
+    def _maybe_request(self):
+        with self.lock:
+            if self.requested or self.upcoming: return
+            remaining = None if self.current_frames is None else self.current_frames - self.played
+            if self.current is None or remaining is None or remaining <= self.lead_frames:
+                self.requested = True
+                self._notify(self.on_need_next)
+
+    def read(self):
+        # Solo lo llama el hilo del reproductor; el lock protege lo que comparte con push()
+        if self.skipping:
+            self.skipping = False
+            if self.current: self.current.cleanup()  # Saltada: no cuenta como fin de pista
+            self.current = None
+        self._maybe_request()
+        if self.current is None: self._advance()
+        data = self.current.read() if self.current else b""
+        ended_at = None
+        while not data and self.current is not None:
+            # Fin de pista: enganchamos la siguiente en este mismo frame
+            ended_at = ended_at or time.perf_counter()
+            if not self._advance(): break
+            data = self.current.read()
+        if not data:
+            # Nada preparado todavía: silencio (nunca b"", o discord.py pararía) y medimos el hueco
+            if self.gap_started is None: self.gap_started = ended_at or time.perf_counter()
+            return OPUS_SILENCE if self.opus else PCM_SILENCE
+        if ended_at and self.gap_started is None: self.gap_started = ended_at
+        if self.gap_started is not None:
+            self._report_gap(self.gap_started)
+        elif self.fade_frames and self.upcoming and self.current_frames:
+            remaining = self.current_frames - self.played
+            if remaining <= self.fade_frames:
+                # Crossfade: la siguiente ya empieza a sonar debajo de la actual
+                with self.lock: upcoming = self.upcoming[0][0] if self.upcoming else None
+                nxt = upcoming.read() if upcoming else None
+                if nxt:
+                    gain = max(remaining, 0) / self.fade_frames
+                    data = mix_pcm(data, nxt, gain, 1 - gain)
+        self.played += 1
+        return data
+
+    def _report_gap(self, since):
+        gap = max(0.0, time.perf_counter() - since - FRAME_SECONDS)
+        self.gap_started = None
+        self._notify(self.on_gap, gap)
+
+    def cleanup(self):
+        if self.current: self.current.cleanup()
+        self.current = None
+        self.take_upcoming()
+
+
+class TimedSource(discord.AudioSource):
+    # Avisa (desde el hilo del reproductor) cuando sale el primer frame de audio
+    def __init__(self, source, on_first_frame):
+        self.source = source
+        self.on_first_frame = on_first_frame
+
+    def is_opus(self):
+        return self.source.is_opus()
+
+    def read(self):
+        data = self.source.read()
+        if data and self.on_first_frame:
+            callback, self.on_first_frame = self.on_first_frame, None
+            callback()
+        return data
+
+    def cleanup(self):
+        self.source.cleanup()
+
+
+def frame_level(frame, is_opus):
+    # Nivel aproximado (0..1) de un frame. Opus no se decodifica: un paquete diminuto es silencio (DTX).
+    if is_opus: return 0.0 if len(frame) <= 10 else 1.0
+    samples = array("h", frame)[::16]  # Submuestreo: sobra para distinguir música de silencio
+    if not samples: return 0.0
+    return math.sqrt(sum(s * s for s in samples) / len(samples)) / 32768
+
+
+class MonitoredSource(discord.AudioSource):
+    # Vigila una fuente remota mientras suena: un hilo lector la lee a su ritmo y mide
+    # el caudal de frames y el nivel. Si se atasca (sin frames durante `stall_timeout`),
+    # se queda en silencio (`silence_seconds`) o termina antes de `duration`, llama a
+    # on_failure(motivo, segundo_actual) desde el hilo y mientras tanto entrega silencio.
+    # Antes del primer frame real read() espera (hasta `stall_timeout`) en vez de rellenar con
+    # silencio: un PrebufferedSource por encima se llenaría de silencio antes de que llegue el audio.
+    # Quien la usa responde con swap(nueva_fuente), ya posicionada en ese segundo, o give_up().
+    def __init__(self, source, on_failure, duration=None, stall_timeout=5, silence_seconds=12,
+                 silence_level=0.001, tail_seconds=15, max_failovers=2, buffer_frames=25):
+        self.source = source
+        self.opus = source.is_opus()
+        self.on_failure = on_failure
+        self.duration = duration
+        self.stall_timeout = stall_timeout
+        self.stall_frames = int(stall_timeout / FRAME_SECONDS)
+        self.silence_frames = int(silence_seconds / FRAME_SECONDS)
+        self.silence_level = silence_level
+        self.tail_seconds = tail_seconds
+        self.max_failovers = max_failovers
+        self.buffer_frames = buffer_frames
+        self.cond = threading.Condition()
+        self.buffer = deque()
+        self.generation = 0
+        self.played = 0            # Frames entregados al reproductor (posición en la pista)
+        self.starved = 0           # Frames de silencio seguidos entregados por falta de datos
+        self.failing_over = False
+        self.failovers = 0
+        self.ended = False
+        self.primed = False        # ¿Ya se esperó al primer frame?
+        self._start_reader()
+
+    def is_opus(self):
+        return self.opus
+
+    @property
+    def position(self):
+        return self.played * FRAME_SECONDS
+
+    def _near_end(self):
+        return self.duration is not None and self.position >= self.duration - self.tail_seconds
+
+    def _start_reader(self):
+        threading.Thread(target=self._read_loop, args=(self.source, self.generation), daemon=True).start()
+
+    def _read_loop(self, source, generation):
+        silent = 0
+        count = 0
+        while True:
+            try:
+                data = source.read()
+            except Exception:
+                data = b""
+            with self.cond:
+                if generation != self.generation: return  # Fuente sustituida: este hilo sobra
+                if not data:
+                    if self.duration and not self._near_end():
+                        self._fail("eof")
+                    else:
+                        self.ended = True
+                    self.cond.notify_all()
+                    return
+                self.buffer.append(data)
+                self.cond.notify_all()
+                while len(self.buffer) >= self.buffer_frames and generation == self.generation:
+                    self.cond.wait(0.5)
+            count += 1
+            if count % 5 == 0:
+                silent = silent + 5 if frame_level(data, self.opus) < self.silence_level else 0
+                if silent >= self.silence_frames and not self._near_end():
+                    silent = 0
+                    with self.cond: self._fail("silence")
+
+    def _fail(self, reason):
+        # Con self.cond tomado
+        if self.failing_over or self.ended: return
+        if self.failovers >= self.max_failovers:
+            self.ended = True
+            return
+        self.failovers += 1
+        self.failing_over = True
+        self.starved = 0
+        self.on_failure(reason, self.position)
+
+    def swap(self, source):
+        # Nueva fuente (ya con seek a la posición actual); el hilo lector viejo se descarta.
+        # False si la pista terminó mientras se re-resolvía (skip, himno...): la nueva se libera.
+        with self.cond:
+            if self.ended:
+                old = source
+            else:
+                old, self.source = self.source, source
+                self.generation += 1
+                self.buffer.clear()
+                self.failing_over = False
+                self.starved = 0
+                self.cond.notify_all()
+                self._start_reader()
+        old.cleanup()
+        return old is not source
+
+    def give_up(self):
+        with self.cond:
+            self.failing_over = False
+            self.ended = True
+            self.cond.notify_all()
+
+    def read(self):
+        with self.cond:
+            if not self.primed:
+                self.primed = True
+                if not self.cond.wait_for(lambda: self.buffer or self.ended or self.failing_over, self.stall_timeout):
+                    self._fail("stall")  # Ni un frame en todo el plazo
+            if self.buffer:
+                data = self.buffer.popleft()
+                self.cond.notify_all()
+                self.played += 1
+                self.starved = 0
+                return data
+            if self.ended: return b""
+            if not self.failing_over:
+                self.starved += 1
+                if self.starved >= self.stall_frames: self._fail("stall")
+        # Sin datos todavía: silencio para que el reproductor siga vivo
+        return OPUS_SILENCE if self.opus else PCM_SILENCE
+
+    def cleanup(self):
+        with self.cond:
+            self.generation += 1
+            self.ended = True
+            self.cond.notify_all()
+        self.source.cleanup()
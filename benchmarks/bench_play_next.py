@@ -0,0 +1,168 @@
+"""Rendimiento de play_next sin red: time-to-first-audio, huecos entre pistas y boletines.
+
+Todo lo externo se sustituye por los dobles de benchmarks/fakes.py (Cobalt, Invidious,
+Piped, wttr.in, RSS, servidores de medios, edge-tts y la conexión de voz de Discord), con
+latencias y fallos reproducibles por escenario. YTDL queda fuera (iría a YouTube).
+
+Uso:
+    python benchmarks/bench_play_next.py [--scenario nombre ...] [--tracks 10] [--frames 150]
+                                          [--bulletins 10] [--mode sequential|hedged] [--gapless]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fakes import Behaviour, FakeAudio, FakeServices, FakeVoiceClient, write_fake_tts  # noqa: E402
+
+# Escenario -> {servicio: Behaviour} (o {(servicio, instancia): Behaviour})
+SCENARIOS = {
+    "baseline": {},
+    "first_two_strategies_down": {"cobalt": Behaviour(failure_rate=1.0), "invidious": Behaviour(failure_rate=1.0)},
+    "first_instance_down": {("cobalt", 0): Behaviour(failure_rate=1.0), ("invidious", 0): Behaviour(failure_rate=1.0),
+                            ("piped", 0): Behaviour(failure_rate=1.0)},
+    "all_instances_slow": {kind: Behaviour(latency=1.5, jitter=0.5) for kind in ("cobalt", "invidious", "piped")},
+    "flaky": {kind: Behaviour(latency=0.2, jitter=0.15, failure_rate=0.3)
+              for kind in ("cobalt", "invidious", "piped", "media")},
+    "slow_bulletin_sources": {"weather": Behaviour(latency=2.0, jitter=1.0), "news": Behaviour(latency=1.0)},
+    # Responden 200 pero sin ningún stream aprovechable: solo Piped sirve
+    "no_usable_streams": {"cobalt": Behaviour(payload={"status": "error", "text": "content unavailable"}),
+                          "invidious": Behaviour(payload={"formatStreams": [], "adaptiveFormats": []})},
+}
+
+
+class Samples:
+    # Sustituye a un Histogram de metrics y guarda los valores crudos para los percentiles
+    def __init__(self):
+        self.values = []
+
+    def observe(self, value, **labels):
+        self.values.append(value)
+
+    def time(self, **labels):
+        return _NullTimer()
+
+
+class _NullTimer:
+    def __enter__(self): return self
+    def __exit__(self, *exc): pass
+
+
+def percentiles(values):
+    if not values: return "      -       -       -       -"
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))] * 1000
+    return f"{pick(0.5):7.0f} {pick(0.9):7.0f} {pick(0.99):7.0f} {values[-1] * 1000:7.0f}"
+
+
+async def run_scenario(radio, services, name, behaviours, args):
+    import metrics
+    from stream_cache import StreamCache
+    from instance_health import InstanceHealth
+
+    services.reset()
+    for key, behaviour in behaviours.items():
+        kind, instance = key if isinstance(key, tuple) else (key, None)
+        services.set(kind, behaviour, instance)
+
+    # Estado limpio: sin cachés, sin historial de salud, un servidor nuevo
+    radio.stream_cache = StreamCache(os.path.join(args.tmp, f"stream_cache_{name}.json"))
+    radio.instance_health = InstanceHealth(os.path.join(args.tmp, f"instance_health_{name}.json"))
+    radio.radios = radio.RadioRegistry(radio.radios.library)
+    radio.weather_cache.clear()
+    radio.news_cache.update(etag=None, modified=None, text=None)
+    ttfa, gaps = Samples(), Samples()
+    metrics.TIME_TO_FIRST_AUDIO, metrics.TRACK_GAP = ttfa, gaps
+
+    # Boletines en frío (sin caché de tiempo ni de noticias): tiempo de render completo
+    bulletins = []
+    for _ in range(args.bulletins):
+        radio.weather_cache.clear()
+        radio.news_cache.update(etag=None, modified=None, text=None)
+        start = time.perf_counter()
+        await radio.render_bulletin()
+        bulletins.append(time.perf_counter() - start)
+
+    state = radio.radios.get(1)
+    vc = FakeVoiceClient()
+    state.voice_client = vc
+    start = time.perf_counter()
+    radio.play_next(state)
+    deadline = start + args.tracks * (args.frames * 0.02 + 30)
+    # Cada cambio de pista registra un hueco (también en modo gapless, donde el reproductor no para)
+    while len(gaps.values) < args.tracks and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    vc.disconnect()
+    for task in state.prefetch_tasks.values(): task.cancel()
+    await asyncio.sleep(0.1)
+
+    print(f"{name:<28} {percentiles(ttfa.values)}   {percentiles(gaps.values)}   {percentiles(bulletins)}  "
+          f"{len(ttfa.values):>3} pistas  {sum(services.requests[k] for k in ('cobalt', 'invidious', 'piped')):>4} peticiones")
+
+
+async def main(args):
+    services = await FakeServices().start()
+
+    os.environ.update(PLAYLIST_DB=os.path.join(args.tmp, "playlist.db"),
+                      TTS_DIR=os.path.join(args.tmp, "tts"),
+                      GAPLESS_MODE="1" if args.gapless else "0",
+                      AUDIO_CACHE_MODE="0")
+    os.chdir(args.tmp)  # lista_canciones.txt no existe aquí: playlist vacía
+    import bot as radio
+
+    radio.bot.loop = asyncio.get_running_loop()
+
+    async def change_presence(**kwargs): pass
+    radio.bot.change_presence = change_presence
+
+    async def make_source(src, stream=False, **_): return FakeAudio(src, frames=args.frames)
+    radio.make_source = make_source
+
+    async def generate_tts(text):
+        await asyncio.sleep(args.tts_latency)
+        return write_fake_tts(radio.TTS_DIR, text)
+    radio.generate_tts = generate_tts
+
+    radio.COBALT_INSTANCES = services.cobalt_instances()
+    radio.INVIDIOUS_INSTANCES = services.invidious_instances()
+    radio.PIPED_INSTANCES = services.piped_instances()
+    radio.WEATHER_URL = services.weather_url()
+    radio.NEWS_FEED = services.news_feed()
+    radio.RESOLVER_PRIORITY = ["cobalt", "invidious", "piped"]
+    radio.RESOLVER_MODE = args.mode
+    for i in range(max(args.tracks * 2, 20)):
+        radio.radios.library.add(f"https://www.youtube.com/watch?v=bench{i:06d}")
+
+    print(f"modo={args.mode} gapless={args.gapless} pistas={args.tracks} x {args.frames * 0.02:.1f}s  (ms)")
+    print(f"{'escenario':<28} {'ttfa p50':>7} {'p90':>7} {'p99':>7} {'max':>7}   "
+          f"{'hueco p50':>7} {'p90':>7} {'p99':>7} {'max':>7}   {'boletín p50':>7} {'p90':>7} {'p99':>7} {'max':>7}")
+    try:
+        for name in args.scenario or SCENARIOS:
+            await run_scenario(radio, services, name, SCENARIOS[name], args)
+    finally:
+        # play_next y precargas que sigan en vuelo tras el último escenario
+        pending = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in pending: task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        await radio.close_http_session()
+        await services.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS))
+    parser.add_argument("--tracks", type=int, default=10)
+    parser.add_argument("--frames", type=int, default=150, help="frames de 20 ms por pista")
+    parser.add_argument("--bulletins", type=int, default=10)
+    parser.add_argument("--tts-latency", type=float, default=0.8)
+    parser.add_argument("--mode", choices=("sequential", "hedged"), default="sequential")
+    parser.add_argument("--gapless", action="store_true")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        args.tmp = tmp
+        asyncio.run(main(args))
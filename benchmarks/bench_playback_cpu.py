@@ -0,0 +1,75 @@
+"""CPU por stream: ruta PCM (ffmpeg decodifica + el bot codifica Opus) frente a ruta Opus.
+
+Lee todos los frames de 20 ms lo más rápido posible, igual que haría el AudioPlayer de
+discord.py, y mide CPU del proceso (codificación en Python/libopus) y de los hijos (ffmpeg).
+
+Uso:
+    python benchmarks/bench_playback_cpu.py [archivo]   (por defecto audio.mp3)
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import discord
+from discord import opus
+
+FRAME_SECONDS = 0.02
+
+
+def cpu_now():
+    own = time.process_time()
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own, children.ru_utime + children.ru_stime
+
+
+def drain(source, encode):
+    encoder = opus.Encoder() if encode else None
+    frames = 0
+    while True:
+        data = source.read()
+        if not data: break
+        if encoder: encoder.encode(data, opus.Encoder.SAMPLES_PER_FRAME)
+        frames += 1
+    source.cleanup()
+    return frames
+
+
+def run(name, make_source, encode):
+    own0, child0 = cpu_now()
+    wall0 = time.perf_counter()
+    frames = drain(make_source(), encode)
+    wall = time.perf_counter() - wall0
+    own1, child1 = cpu_now()
+    audio_minutes = frames * FRAME_SECONDS / 60 or 1
+    own, child = own1 - own0, child1 - child0
+    print(f"{name:<28} {frames:>7} frames  bot {own / audio_minutes:6.2f}s/min  "
+          f"ffmpeg {child / audio_minutes:6.2f}s/min  total {(own + child) / audio_minutes:6.2f}s/min  "
+          f"(wall {wall:.1f}s)")
+
+
+def main():
+    src = sys.argv[1] if len(sys.argv) > 1 else "audio.mp3"
+    if not os.path.exists(src):
+        sys.exit(f"No existe {src}")
+    if not opus.is_loaded():
+        opus._load_default()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Versión Opus/Ogg del mismo audio, como la que deja la caché local
+        ogg = os.path.join(tmp, "bench.ogg")
+        subprocess.run(["ffmpeg", "-loglevel", "error", "-y", "-i", src, "-vn", "-c:a", "libopus", "-b:a", "96k", ogg],
+                       check=True)
+
+        print(f"Fuente: {src}")
+        run("pcm (decode + encode)", lambda: discord.FFmpegPCMAudio(src), encode=True)
+        run("opus (ffmpeg transcode)", lambda: discord.FFmpegOpusAudio(src), encode=False)
+        print(f"Fuente: {ogg} (opus)")
+        run("pcm (decode + encode)", lambda: discord.FFmpegPCMAudio(ogg), encode=True)
+        run("opus (passthrough copy)", lambda: discord.FFmpegOpusAudio(ogg, codec="opus"), encode=False)
+
+
+if __name__ == "__main__":
+    main()
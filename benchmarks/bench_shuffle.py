@@ -0,0 +1,49 @@
+"""Coste por elección del ShuffleBag frente al get_next_song antiguo, de 100 a 100k canciones.
+
+Uso:
+    python benchmarks/bench_shuffle.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from shuffle import ShuffleBag  # noqa: E402
+
+PICKS = 20000
+
+
+def old_pick(playlist, last_played):
+    # Copia filtrada + random.choice, como hacía RadioState.get_next_song
+    choices = playlist
+    if len(choices) > 1 and last_played in choices:
+        choices = [c for c in choices if c != last_played]
+    return random.choice(choices)
+
+
+def main():
+    print(f"{'canciones':>10} {'bag µs/pick':>12} {'antiguo µs/pick':>16}")
+    for size in (100, 1_000, 10_000, 100_000):
+        items = [f"https://www.youtube.com/watch?v={i:011d}" for i in range(size)]
+        plays = {item: random.randint(0, 20) for item in items}
+        bag = ShuffleBag(items, min_distance=50, history_weight=0.5, plays=plays)
+
+        start = time.perf_counter()
+        for _ in range(PICKS):
+            bag.pick()
+        bag_us = (time.perf_counter() - start) / PICKS * 1e6
+
+        old_picks = max(PICKS // max(size // 1000, 1), 200)
+        last = None
+        start = time.perf_counter()
+        for _ in range(old_picks):
+            last = old_pick(items, last)
+        old_us = (time.perf_counter() - start) / old_picks * 1e6
+
+        print(f"{size:>10} {bag_us:>12.2f} {old_us:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""Dobles locales de todo lo externo que toca play_next, para medir sin red.
+
+- FakeServices: un servidor aiohttp en 127.0.0.1 que imita Cobalt, Invidious, Piped,
+  wttr.in, el RSS de rbb24 y los servidores de medios (googlevideo). Cada servicio
+  (y cada instancia) tiene su Behaviour: latencia, jitter, tasa de fallos y, si hace
+  falta, el cuerpo de la respuesta (p. ej. un 200 con `{"audioStreams": []}`).
+- FakeAudio: AudioSource que, como ffmpeg, abre la URL antes del primer frame.
+- FakeVoiceClient: reproductor con la semántica de VoiceClient (hilo propio, frames de
+  20 ms, callback `after` desde ese hilo).
+"""
+import asyncio
+import hashlib
+import os
+import random
+import threading
+import time
+import urllib.request
+
+import discord
+from aiohttp import web
+
+FRAME_SECONDS = 0.02
+PCM_FRAME = b"\x01\x00" * 1920  # 20 ms de PCM s16le estéreo 48 kHz (no silencio)
+
+KINDS = ("cobalt", "invidious", "piped", "weather", "news", "media")
+
+RSS = """<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0"><channel><title>rbb24</title>
+<item><title>Testnachricht aus Berlin</title>
+<description>Der Senat hat heute über den Haushalt beraten.&lt;br/&gt;</description></item>
+</channel></rss>"""
+
+
+class Behaviour:
+    def __init__(self, latency=0.05, jitter=0.0, failure_rate=0.0, status=503, payload=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.status = status
+        # Cuerpo que sustituye al normal del servicio: dict/list -> JSON, str -> texto, bytes tal cual
+        self.payload = payload
+
+    def delay(self, rng):
+        return max(0.0, self.latency + rng.uniform(-self.jitter, self.jitter))
+
+    def fails(self, rng):
+        return rng.random() < self.failure_rate
+
+
+class FakeServices:
+    def __init__(self, instances=3, seed=1):
+        self.instances = instances
+        self.rng = random.Random(seed)
+        self.behaviours = {}
+        self.requests = {kind: 0 for kind in KINDS}
+        self.runner = None
+        self.base = None
+        self.reset()
+
+    def reset(self, seed=1):
+        self.rng.seed(seed)
+        self.behaviours = {kind: Behaviour() for kind in KINDS}
+        self.requests = {kind: 0 for kind in KINDS}
+
+    def set(self, kind, behaviour, instance=None):
+        # instance=None: el servicio entero; si no, solo esa instancia (índice)
+        self.behaviours[kind if instance is None else (kind, instance)] = behaviour
+
+    def behaviour(self, kind, instance=None):
+        return self.behaviours.get((kind, instance)) or self.behaviours[kind]
+
+    # --- URLs para configurar el bot ---
+    def cobalt_instances(self):
+        return [f"{self.base}/cobalt/{i}/api/json" for i in range(self.instances)]
+
+    def invidious_instances(self):
+        return [f"{self.base}/invidious/{i}" for i in range(self.instances)]
+
+    def piped_instances(self):
+        return [f"{self.base}/piped/{i}" for i in range(self.instances)]
+
+    def weather_url(self):
+        return f"{self.base}/weather/{{city}}"
+
+    def news_feed(self):
+        return f"{self.base}/news.xml"
+
+    def media_url(self, video_id):
+        return f"{self.base}/media/{video_id}"
+
+    # --- Servidor ---
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/cobalt/{i}/api/json", self.cobalt)
+        app.router.add_get("/invidious/{i}/api/v1/videos/{vid}", self.invidious)
+        app.router.add_get("/piped/{i}/streams/{vid}", self.piped)
+        app.router.add_get("/weather/{city}", self.weather)
+        app.router.add_get("/news.xml", self.news)
+        app.router.add_get("/media/{vid}", self.media)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base = f"http://127.0.0.1:{port}"
+        return self
+
+    async def stop(self):
+        if self.runner: await self.runner.cleanup()
+
+    async def _serve(self, kind, instance=None):
+        # Espera la latencia configurada. (respuesta de error si toca fallar, payload configurado o None)
+        self.requests[kind] += 1
+        behaviour = self.behaviour(kind, instance)
+        delay = behaviour.delay(self.rng)
+        if delay: await asyncio.sleep(delay)
+        if behaviour.fails(self.rng):
+            return web.Response(status=behaviour.status, text="fake failure"), None
+        return None, behaviour.payload
+
+    @staticmethod
+    def _respond(payload, **kwargs):
+        if isinstance(payload, (dict, list)): return web.json_response(payload, **kwargs)
+        if isinstance(payload, bytes): return web.Response(body=payload, **kwargs)
+        return web.Response(text=payload, **kwargs)
+
+    async def cobalt(self, request):
+        error, payload = await self._serve("cobalt", int(request.match_info["i"]))
+        if error: return error
+        vid = (await request.json())["url"].rsplit("=", 1)[-1]
+        return self._respond({"status": "stream", "url": self.media_url(vid)} if payload is None else payload)
+
+    async def invidious(self, request):
+        error, payload = await self._serve("invidious", int(request.match_info["i"]))
+        if error: return error
+        vid = request.match_info["vid"]
+        default = {"formatStreams": [{"url": self.media_url(vid), "bitrate": "128000"}]}
+        return self._respond(default if payload is None else payload)
+
+    async def piped(self, request):
+        error, payload = await self._serve("piped", int(request.match_info["i"]))
+        if error: return error
+        vid = request.match_info["vid"]
+        default = {"audioStreams": [{"url": self.media_url(vid), "bitrate": 128000}]}
+        return self._respond(default if payload is None else payload)
+
+    async def weather(self, request):
+        error, payload = await self._serve("weather")
+        return error or self._respond("+12°C Sonnig\n" if payload is None else payload)
+
+    async def news(self, request):
+        error, payload = await self._serve("news")
+        if error: return error
+        body = RSS if payload is None else payload
+        etag = '"' + hashlib.sha1(body.encode()).hexdigest()[:12] + '"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(text=body, content_type="application/rss+xml", headers={"ETag": etag})
+
+    async def media(self, request):
+        # Solo importa la latencia hasta el primer byte: el audio lo "genera" FakeAudio
+        error, payload = await self._serve("media")
+        return error or self._respond(b"\x00" * 1024 if payload is None else payload, content_type="audio/webm")
+
+
+class FakeAudio(discord.AudioSource):
+    # Como FFmpegPCMAudio: la primera lectura espera a que el servidor de medios responda.
+    # Si la URL falla devuelve b"" (ffmpeg muere y el reproductor termina la pista).
+    def __init__(self, src, frames=150):
+        self.src = src
+        self.frames = frames
+        self.opened = False
+
+    def is_opus(self):
+        return False
+
+    def read(self):
+        if not self.opened:
+            self.opened = True
+            if self.src.startswith("http"):
+                try:
+                    with urllib.request.urlopen(self.src, timeout=10) as resp: resp.read(1)
+                except Exception:
+                    self.frames = 0
+        if self.frames <= 0: return b""
+        self.frames -= 1
+        return PCM_FRAME
+
+
+class FakeVoiceClient:
+    # Misma semántica que VoiceClient para lo que usa el bot: play/stop/is_playing/is_connected
+    def __init__(self, frame_seconds=FRAME_SECONDS):
+        self.frame_seconds = frame_seconds
+        self.connected = True
+        self.channel = None
+        self.source = None
+        self.stopped = threading.Event()
+        self.frames_played = 0
+        self.tracks_started = 0
+        self.thread = None
+
+    def is_connected(self):
+        return self.connected
+
+    def is_playing(self):
+        return self.source is not None
+
+    def play(self, source, *, after=None):
+        if self.source is not None: raise discord.ClientException("Already playing audio.")
+        self.source = source
+        self.stopped = threading.Event()
+        self.tracks_started += 1
+        self.thread = threading.Thread(target=self._run, args=(source, after, self.stopped), daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def disconnect(self):
+        self.connected = False
+        self.stop()
+
+    def _run(self, source, after, stopped):
+        error = None
+        next_tick = time.perf_counter()
+        try:
+            while not stopped.is_set():
+                if not source.read(): break
+                self.frames_played += 1
+                next_tick += self.frame_seconds
+                delay = next_tick - time.perf_counter()
+                if delay > 0: time.sleep(delay)
+        except Exception as e:
+            error = e
+        finally:
+            source.cleanup()
+            self.source = None
+        if after and self.connected: after(error)
+
+
+def write_fake_tts(directory, text):
+    # Sustituto de edge-tts (servicio de Microsoft): un archivo por texto
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, hashlib.sha1(text.encode()).hexdigest()[:16] + ".mp3")
+    with open(path, "wb") as f: f.write(b"\x00" * 1024)
+    return path
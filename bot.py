@@ -1,28 +1,165 @@
 
+import time
+BOOT_STARTED = time.perf_counter()
 import discord
 from discord.ext import commands
 import asyncio
 import os
-import yt_dlp
-import edge_tts
-import feedparser
-import random
 import datetime
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.cron import CronTrigger
+from zoneinfo import ZoneInfo
+import importlib
 from keep_alive import keep_alive
+from stream_cache import EXPIRY_MARGIN, StreamCache, url_expiry
+from instance_health import InstanceHealth
+from ytdl_pool import YtdlPool, YtdlQueueFull
+from audio_cache import AudioCache
+from playlist_store import PlaylistStore
+from shuffle import ShuffleBag
+from broadcast import Station
+from audio_sources import GaplessChain, MonitoredSource, TimedSource
+import metrics
+from loop_watchdog import LoopWatchdog, SamplingProfiler
+from votes import VoteBook
+import importer
+from quarantine import Quarantine
+import loudness as r128
+from asset_bank import AssetBank
+from collections import deque
 import aiohttp
 from dotenv import load_dotenv
 import math
+import re
+import hashlib
+import io
+import threading
 
 load_dotenv(override=True)
 
+# ---------------- STARTUP TIMING ----------------
+class StartupTimer:
+    # Duración de cada fase del arranque, desde el primer import hasta terminar el warm-up
+    def __init__(self, started):
+        self.last = started
+        self.phases = []
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        metrics.STARTUP_SECONDS.set(now - self.last, phase=phase)
+        self.last = now
+
+    def report(self):
+        total = sum(seconds for _, seconds in self.phases)
+        return f"⏱️ Arranque en {total:.2f}s: " + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in self.phases)
+
+startup = StartupTimer(BOOT_STARTED)
+startup.mark("imports")
+
 # ---------------- CONFIG ----------------
 TOKEN = os.getenv("DISCORD_TOKEN")
 ADMIN_USER = "arnaupq"
 CITIES = ["Berlin", "Wiesbaden", "Munchen", "Hamburg", "Palma de Mallorca"]
-NEWS_FEED = "https://www.rbb24.de/aktuell/index.xml/feed=rss.xml"
+NEWS_FEED = os.getenv("NEWS_FEED", "https://www.rbb24.de/aktuell/index.xml/feed=rss.xml")
+WEATHER_URL = os.getenv("WEATHER_URL", "https://wttr.in/{city}?format=%t+%C")
 DEUTSCHLAND_FILE = "deutschland.m4a"
+ANTHEM_TIMEZONE = ZoneInfo("Europe/Berlin")
+# Playlist permanente (SQLite). lista_canciones.txt solo se lee una vez para migrar.
+PLAYLIST_DB = os.getenv("PLAYLIST_DB", "playlist.db")
+SHARDED = os.getenv("SHARDED", "0") == "1"
+# Modo emisión: una sola emisora (cola, ffmpeg, Opus) que escuchan todos los servidores
+BROADCAST_MODE = os.getenv("BROADCAST_MODE", "0") == "1"
+BROADCAST_ID = "broadcast"
+# Shuffle: canciones distintas que deben sonar antes de repetir una, y cuánto pesa el historial
+SHUFFLE_MIN_DISTANCE = int(os.getenv("SHUFFLE_MIN_DISTANCE", "10"))
+SHUFFLE_HISTORY_WEIGHT = float(os.getenv("SHUFFLE_HISTORY_WEIGHT", "0.5"))
+# Cuántas canciones se resuelven por adelantado mientras suena la actual
+PREFETCH_AHEAD = int(os.getenv("PREFETCH_AHEAD", "2"))
+# Caché persistente de stream URLs (ver stream_cache.py)
+STREAM_CACHE_FILE = os.getenv("STREAM_CACHE_FILE", "stream_cache.json")
+STREAM_CACHE_PROBE = os.getenv("STREAM_CACHE_PROBE", "1") == "1"
+# Orden de preferencia de las estrategias de resolución
+RESOLVER_PRIORITY = os.getenv("RESOLVER_PRIORITY", "cobalt,invidious,piped,ytdl").split(",")
+# "sequential" (una tras otra) o "hedged" (en paralelo, escalonadas cada HEDGE_DELAY s)
+RESOLVER_MODE = os.getenv("RESOLVER_MODE", "sequential")
+HEDGE_DELAY = float(os.getenv("HEDGE_DELAY", "0.75"))
+# Cliente HTTP compartido (keep-alive): límites de conexiones y timeout por defecto
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "50"))
+HTTP_POOL_PER_HOST = int(os.getenv("HTTP_POOL_PER_HOST", "4"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+
+# Instancias de las APIs de streams (separadas por comas para sobreescribir por env)
+COBALT_INSTANCES = os.getenv("COBALT_INSTANCES", "https://api.cobalt.tools/api/json").split(",")
+INVIDIOUS_INSTANCES = os.getenv("INVIDIOUS_INSTANCES", ",".join([
+    "https://inv.tux.pizza",
+    "https://invidious.jing.rocks",
+    "https://inv.nadeko.net",
+    "https://invidious.nerdvpn.de",
+])).split(",")
+PIPED_INSTANCES = os.getenv("PIPED_INSTANCES", ",".join([
+    "https://pipedapi.kavin.rocks",
+    "https://pipedapi.leptons.xyz",
+    "https://api.piped.privacy.com.de",
+])).split(",")
+# Caché local de audio (Opus/Ogg) para la playlist permanente: 1 = activada
+AUDIO_CACHE_MODE = os.getenv("AUDIO_CACHE_MODE", "0") == "1"
+AUDIO_CACHE_DIR = os.getenv("AUDIO_CACHE_DIR", "audio_cache")
+AUDIO_CACHE_MAX_MB = int(os.getenv("AUDIO_CACHE_MAX_MB", "2048"))
+# "pcm": ffmpeg decodifica y el bot codifica Opus (modo clásico)
+# "opus": ffmpeg entrega Opus; si la fuente ya es Opus se copia sin recodificar
+PLAYBACK_MODE = os.getenv("PLAYBACK_MODE", "pcm")
+# Boletines (tiempo + noticias) pre-renderizados en segundo plano
+TTS_DIR = os.getenv("TTS_DIR", "tts_cache")
+BULLETIN_REFRESH_MINUTES = int(os.getenv("BULLETIN_REFRESH_MINUTES", "10"))
+WEATHER_TTL = int(os.getenv("WEATHER_TTL", "1800"))  # El tiempo no cambia cada 7 canciones
+TTS_MAX_AGE = 2 * 60 * 60  # Segundos que se conserva un audio TTS en disco
+# Gapless: la siguiente pista se lanza (ffmpeg + pre-buffer) GAPLESS_LEAD s antes de que acabe la actual
+GAPLESS_MODE = os.getenv("GAPLESS_MODE", "0") == "1"
+GAPLESS_LEAD = float(os.getenv("GAPLESS_LEAD", "15"))
+GAPLESS_CROSSFADE = float(os.getenv("GAPLESS_CROSSFADE", "0"))  # Solo con PLAYBACK_MODE=pcm
+GAPLESS_PREBUFFER_FRAMES = int(os.getenv("GAPLESS_PREBUFFER_FRAMES", "50"))  # 20 ms cada uno
+INSTANCE_HEALTH_FILE = os.getenv("INSTANCE_HEALTH_FILE", "instance_health.json")
+# Watchdog del event loop: si un ping tarda más de LOOP_STALL_THRESHOLD s, se guarda la pila del bloqueo
+LOOP_WATCHDOG_INTERVAL = float(os.getenv("LOOP_WATCHDOG_INTERVAL", "0.1"))
+LOOP_STALL_THRESHOLD = float(os.getenv("LOOP_STALL_THRESHOLD", "0.2"))
+PROFILER_INTERVAL = float(os.getenv("PROFILER_INTERVAL", "0.005"))
+VOTE_TIMEOUT = float(os.getenv("VOTE_TIMEOUT", "60"))
+# Reproducción: espera creciente si fallan pistas seguidas, y cuarentena para las que fallan siempre
+BACKOFF_BASE = float(os.getenv("BACKOFF_BASE", "2"))
+BACKOFF_MAX = float(os.getenv("BACKOFF_MAX", "300"))
+IDLE_RETRY = float(os.getenv("IDLE_RETRY", "30"))  # Playlist vacía: volver a mirar cada X s
+QUARANTINE_FILE = os.getenv("QUARANTINE_FILE", "quarantine.json")
+QUARANTINE_AFTER = int(os.getenv("QUARANTINE_AFTER", "3"))
+QUARANTINE_RETEST_MINUTES = float(os.getenv("QUARANTINE_RETEST_MINUTES", "30"))
+QUARANTINE_RETEST_BATCH = int(os.getenv("QUARANTINE_RETEST_BATCH", "5"))
+# Con tantos fallos seguidos (de canciones distintas) asumimos caída de red/APIs: no se pone nada en cuarentena
+OUTAGE_STREAK = int(os.getenv("OUTAGE_STREAK", "5"))
+# Vigilancia de streams en reproducción: atasco / silencio / corte prematuro => re-resolver y seguir por el mismo segundo
+MONITOR_STREAMS = os.getenv("MONITOR_STREAMS", "1") == "1"
+MONITOR_STALL_TIMEOUT = float(os.getenv("MONITOR_STALL_TIMEOUT", "5"))
+MONITOR_SILENCE_SECONDS = float(os.getenv("MONITOR_SILENCE_SECONDS", "12"))
+MONITOR_MAX_FAILOVERS = int(os.getenv("MONITOR_MAX_FAILOVERS", "2"))
+# Normalización de volumen (EBU R128): cada pista se mide una vez en segundo plano y al
+# reproducir se aplica la ganancia guardada con un simple "volume=XdB" de ffmpeg.
+# Opcional como los demás modos pesados: descarga cada canción una vez y, en PLAYBACK_MODE=opus,
+# una ganancia desactiva el passthrough de esa pista.
+LOUDNESS_MODE = os.getenv("LOUDNESS_MODE", "0") == "1"
+LOUDNESS_FILE = os.getenv("LOUDNESS_FILE", "loudness.json")
+LOUDNESS_TARGET = float(os.getenv("LOUDNESS_TARGET", "-16"))    # LUFS
+LOUDNESS_MIN_GAIN = float(os.getenv("LOUDNESS_MIN_GAIN", "1"))  # dB; por debajo no se pone filtro
+LOUDNESS_INTERVAL = float(os.getenv("LOUDNESS_INTERVAL", "20"))  # Segundos entre dos análisis
+# Banco de audio en memoria: archivos locales pre-decodificados a paquetes Opus al arrancar.
+# El himno se "arma" ANTHEM_ARM_SECONDS s antes de medianoche (voz conectada, audio en RAM).
+ASSET_BANK_MODE = os.getenv("ASSET_BANK_MODE", "1") == "1"
+# Por defecto solo el himno: es lo único que se reproduce desde el banco
+ASSET_FILES = [f for f in os.getenv("ASSET_FILES", DEUTSCHLAND_FILE).split(",") if f]
+ANTHEM_ARM_SECONDS = int(os.getenv("ANTHEM_ARM_SECONDS", "30"))
+WARMUP_GUILDS = int(os.getenv("WARMUP_GUILDS", "3"))  # Servidores cuyas primeras canciones se resuelven al arrancar
+# :import — validación por oEmbed de YouTube: peticiones simultáneas y por segundo
+IMPORT_CONCURRENCY = int(os.getenv("IMPORT_CONCURRENCY", "8"))
+IMPORT_RATE = float(os.getenv("IMPORT_RATE", "10"))
+IMPORT_BATCH = int(os.getenv("IMPORT_BATCH", "50"))
+IMPORT_PLAYLIST_TIMEOUT = float(os.getenv("IMPORT_PLAYLIST_TIMEOUT", "180"))
+OEMBED_URL = os.getenv("OEMBED_URL", "https://www.youtube.com/oembed")
 
 # Lista de proxies para rotación en caso de fallo (vacío por defecto)
 PROXIES = [
@@ -32,25 +169,19 @@ PROXIES = [
 # ---------------- COOKIES SETUP (ENV VAR) ----------------
 # Si existe la variable de entorno COOKIES_CONTENT, creamos el archivo cookies.txt al vuelo.
 # Esto es para mantener el secreto en Render sin subir el archivo.
-cookies_content = os.getenv("COOKIES_CONTENT")
-if cookies_content:
-    with open("cookies.txt", "w") as f:
-        f.write(cookies_content)
-    print("🍪 cookies.txt creado desde variable de entorno.")
-elif os.path.exists("cookies.txt"):
-    print("🍪 cookies.txt encontrado en el sistema (Secret File o local).")
-else:
-    print("⚠️ NO SE ENCONTRÓ COOKIES.TXT (Ni variable ni archivo).")
-
-# DEBUG EXTRA: Confirmar ruta y tamaño para Render
-abs_cookie_path = os.path.abspath("cookies.txt")
-if os.path.exists(abs_cookie_path):
-    print(f"📊 DEBUG PATH: {abs_cookie_path}")
-    print(f"📊 DEBUG SIZE: {os.path.getsize(abs_cookie_path)} bytes")
-else:
-    print(f"❌ DEBUG: El archivo NO existe en {abs_cookie_path}")
-
-# Configuración YTDL (Modo Android + Cookies)
+# Se hace al arrancar el bot (no al importar bot.py: benchmarks y herramientas no lo tocan).
+def setup_cookies():
+    cookies_content = os.getenv("COOKIES_CONTENT")
+    if cookies_content:
+        with open("cookies.txt", "w") as f:
+            f.write(cookies_content)
+        print("🍪 cookies.txt creado desde variable de entorno.")
+    abs_cookie_path = os.path.abspath("cookies.txt")
+    if os.path.exists(abs_cookie_path):
+        print(f"🍪 cookies.txt: {abs_cookie_path} ({os.path.getsize(abs_cookie_path)} bytes)")
+    else:
+        print("⚠️ NO SE ENCONTRÓ COOKIES.TXT (Ni variable ni archivo).")
+
 YTDL_OPTS = {
     'format': 'bestaudio/best',
     'noplaylist': True,
@@ -65,336 +196,1049 @@ YTDL_OPTS = {
     'logtostderr': True, # <--- DEBUG: Logs a stderr
     'no_warnings': False, # <--- DEBUG: Ver warnings
 }
+# Pool dedicado de yt-dlp (ver ytdl_pool.py)
+YTDL_WORKERS = int(os.getenv("YTDL_WORKERS", "2"))
+YTDL_MAX_QUEUE = int(os.getenv("YTDL_MAX_QUEUE", "8"))
+YTDL_TIMEOUT = float(os.getenv("YTDL_TIMEOUT", "30"))
 
-# (Omitted Middle Sections - Keeping API helpers as they are useful fallbacks if cookies fail or for speed)
+FFMPEG_OPTS = {
+    'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5',
+    'options': '-vn'
+}
 
-# ---------------- PLAYBACK LOGIC ----------------
-async def play_next(ctx_or_vc):
-    vc = state.voice_client
-    if not vc or not vc.is_connected(): return
+# ---------------- HTTP CLIENT ----------------
+# Una sola sesión para todo el bot: reutiliza conexiones TLS y cachea DNS entre llamadas.
+http_session = None
 
-    if state.next_tts_message:
-        text, state.next_tts_message = state.next_tts_message, None
-        tts_file = await generate_tts(text)
-        vc.play(discord.FFmpegPCMAudio(tts_file), after=lambda e: bot.loop.create_task(play_next(ctx_or_vc)))
-        return
+def get_http_session():
+    global http_session
+    if http_session is None or http_session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_POOL_PER_HOST,
+            ttl_dns_cache=300,
+            keepalive_timeout=60,
+        )
+        timeout = aiohttp.ClientTimeout(total=HTTP_TIMEOUT, connect=5)
+        http_session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+    return http_session
 
-    if state.song_counter > 0 and state.song_counter % 7 == 0:
-        state.song_counter += 1
-        weather = await get_weather_text()
-        news = await get_berlin_news()
-        full_text = f"Das Wetter. {weather}. Und nun die Nachrichten. {news}. Weiter geht es mit Musik."
-        state.next_tts_message = full_text
-        await play_next(ctx_or_vc)
-        return
+async def close_http_session():
+    global http_session
+    if http_session and not http_session.closed:
+        await http_session.close()
+    http_session = None
 
-    song_url = state.get_next_song()
-    if not song_url:
-        await asyncio.sleep(10); await play_next(ctx_or_vc); return
+# Con SHARDED=1 se usa AutoShardedBot (muchos servidores)
+class RadioBot(commands.AutoShardedBot if SHARDED else commands.Bot):
+    async def close(self):
+        loop_watchdog.stop()
+        instance_health.save()
+        if audio_cache: audio_cache.save()
+        ytdl_pool.shutdown()
+        if radios.station: radios.station.close()
+        await close_http_session()
+        await super().close()
 
-    print(f"🔍 Procesando: {song_url}")
-    stream_url = None
-    title = "Radio Stream"
+intents = discord.Intents.default()
+intents.message_content = True
+bot = RadioBot(command_prefix=":", intents=intents)
 
-    # STRATEGY 1: COBALT (Prioridad por rapidez)
-    if not stream_url and ("youtube.com" in song_url or "youtu.be" in song_url):
-        stream_url = await get_stream_from_cobalt(song_url)
-        if stream_url: title = "Radio Play (Cobalt)"
+def extract_video_id(url):
+    if "v=" in url: return url.split("v=")[1].split("&")[0]
+    elif "youtu.be/" in url: return url.split("youtu.be/")[1].split("?")[0]
+    return None
 
-    # STRATEGY 2: LOCAL YTDL + COOKIES (La más fiable con login)
-    if not stream_url:
-        try:
-            loop = asyncio.get_event_loop()
-            data = await loop.run_in_executor(None, lambda: yt_dlp.YoutubeDL(YTDL_OPTS).extract_info(song_url, download=False))
-            if 'entries' in data: data = data['entries'][0]
-            stream_url = data['url']; title = data.get('title', 'Unknown')
-        except Exception as e:
-            print(f"❌ YTDL (Cookies) falló: {e}")
+# ---------------- STATE ----------------
+class Library:
+    # Playlist permanente de la emisora, compartida por todos los servidores
+    def __init__(self):
+        self.playlist_file = "lista_canciones.txt"
+        self.store = PlaylistStore(PLAYLIST_DB)
+        self.store.migrate_from_text(self.playlist_file, extract_video_id)
+        self.permanent_playlist = self.store.all_urls()
 
-    # STRATEGY 3: FALLBACK APIs (Piped/Invidious)
-    if not stream_url:
-        vid = extract_video_id(song_url)
-        if vid:
-            stream_url = await get_stream_from_piped(vid) or await get_stream_from_invidious(vid)
-            if stream_url: title = "Radio Play (API Fallback)"
+    def add(self, song):
+        # False si ya estaba (misma URL o mismo vídeo)
+        if not self.store.add(song, video_id=extract_video_id(song)): return False
+        self.permanent_playlist.append(song)
+        return True
 
-    if stream_url:
-        print(f"▶️ Reproduciendo: {title}")
-        state.song_counter += 1
-        SAFE_FFMPEG = {'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5', 'options': '-vn'}
-        source = discord.FFmpegPCMAudio(stream_url, **SAFE_FFMPEG)
-        vc.play(source, after=lambda e: bot.loop.create_task(play_next(ctx_or_vc)))
-        await bot.change_presence(activity=discord.Activity(type=discord.ActivityType.listening, name=title))
-    else:
-        print("❌ Imposible reproducir canción. Saltando...")
-        state.song_counter += 1
-        await asyncio.sleep(5)
-        await play_next(ctx_or_vc)
-FFMPEG_OPTS = {
-    'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5',
-    'options': '-vn'
-}
+    def add_many(self, songs):
+        # songs: (url, video_id, title, duration). Una transacción; devuelve las URLs nuevas.
+        before = set(self.permanent_playlist)
+        self.store.add_many(songs)
+        self.permanent_playlist = self.store.all_urls()
+        return [s for s in self.permanent_playlist if s not in before]
 
-intents = discord.Intents.default()
-intents.message_content = True
-bot = commands.Bot(command_prefix=":", intents=intents)
+    def remove(self, query):
+        removed = set(self.store.remove(query))
+        if removed:
+            self.permanent_playlist = [s for s in self.permanent_playlist if s not in removed]
+        return removed
 
-# ---------------- STATE ----------------
 class RadioState:
-    def __init__(self):
+    # Estado de la radio en UN servidor: cola, contador, votos, conexión de voz...
+    def __init__(self, guild_id, library):
+        self.guild_id = guild_id
+        self.library = library
         self.queue = []
         self.song_counter = 0
         self.voice_client = None
-        self.playlist_file = "lista_canciones.txt"
-        self.load_playlist()
-        self.next_tts_message = None
-        self.active_vote = False
+        self.next_tts_file = None
+        self.last_played = None
+        # Próximas canciones de la playlist ya elegidas, para poder precargarlas
+        self.upcoming = []
+        # song_url -> Task que resuelve (stream_url, title) en segundo plano
+        self.prefetch_tasks = {}
+        self.gapless = None           # GaplessChain en curso (GAPLESS_MODE)
+        self.track_ended_at = None
+        self.gaps = deque(maxlen=100)  # Huecos medidos entre pistas (segundos)
+        # Bucle de reproducción (station_loop): se despierta con `wake` cuando hace falta otra pista
+        self.wake = asyncio.Event()
+        self.player = None
+        self.current_song = None      # URL de la pista en curso (None para TTS/himno)
+        self.current_track = None     # Gapless: la pista (dict) que suena ahora dentro de la cadena
+        self.audio_started = False    # ¿Dio algún frame? Si acaba sin darlo, cuenta como fallo
+        self.dead_song = None
+        self.failures = 0             # Fallos seguidos de la emisora (para el backoff)
+        playable = [s for s in library.permanent_playlist if s not in quarantine]
+        self.shuffle = ShuffleBag(playable, min_distance=SHUFFLE_MIN_DISTANCE,
+                                  history_weight=SHUFFLE_HISTORY_WEIGHT, plays=library.store.play_counts())
 
-    def load_playlist(self):
-        if not os.path.exists(self.playlist_file):
-            with open(self.playlist_file, "w") as f: f.write("")
-        with open(self.playlist_file, "r") as f:
-            self.permanent_playlist = [l.strip() for l in f.readlines() if l.strip()]
+    @property
+    def permanent_playlist(self):
+        return self.library.permanent_playlist
 
-    def add_to_playlist(self, song):
-        self.permanent_playlist.append(song)
-        with open(self.playlist_file, "a") as f:
-            f.write(f"\n{song}")
-            
-    def remove_from_playlist(self, query):
-        initial_len = len(self.permanent_playlist)
-        self.permanent_playlist = [s for s in self.permanent_playlist if query.lower() not in s.lower()]
-        with open(self.playlist_file, "w") as f:
-            for s in self.permanent_playlist:
-                f.write(f"{s}\n")
-        return initial_len - len(self.permanent_playlist)
+    def song_added(self, song):
+        self.shuffle.add(song)
+
+    def songs_removed(self, removed):
+        self.upcoming = [s for s in self.upcoming if s not in removed]
+        for song in removed: self.shuffle.remove(song)
+
+    def pick_from_playlist(self):
+        song = self.shuffle.pick()
+        if song: self.library.store.record_play(song)
+        return song
+
+    def peek_next_songs(self, n):
+        # Decide de antemano las siguientes n canciones (cola primero, luego playlist)
+        # Sobre el shuffle, no la playlist: con todo en cuarentena pick() devuelve None
+        while len(self.queue) + len(self.upcoming) < n and len(self.shuffle):
+            song = self.pick_from_playlist()
+            if song is None: break
+            self.upcoming.append(song)
+        return (self.queue + self.upcoming)[:n]
 
     def get_next_song(self):
         if self.queue:
-            state.active_vote = False # Reset vote if we are playing from queue
             self.last_played = self.queue.pop(0)
             return self.last_played
+
+        if self.upcoming:
+            self.last_played = self.upcoming.pop(0)
+            return self.last_played
             
         if self.permanent_playlist:
-            choices = self.permanent_playlist
-            # Avoid repeating last song if possible
-            if len(choices) > 1 and hasattr(self, 'last_played') and self.last_played in choices:
-                 choices = [c for c in choices if c != self.last_played]
-            
-            self.last_played = random.choice(choices)
+            self.last_played = self.pick_from_playlist()
             return self.last_played
         return None
 
-state = RadioState()
-scheduler = AsyncIOScheduler()
+class RadioRegistry:
+    # Un RadioState por servidor, creado al primer uso
+    def __init__(self, library):
+        self.library = library
+        self.states = {}
+        self.ready_bulletin = None  # Ruta del último boletín ya renderizado (común a todos)
+        if BROADCAST_MODE:
+            # La "conexión de voz" de la emisora es el Station; los servidores se suscriben
+            self.get(BROADCAST_ID).voice_client = Station()
+
+    @property
+    def station(self):
+        return self.states[BROADCAST_ID].voice_client if BROADCAST_MODE else None
+
+    def get(self, guild):
+        guild_id = guild.id if hasattr(guild, "id") else guild
+        if BROADCAST_MODE: guild_id = BROADCAST_ID
+        if guild_id not in self.states:
+            self.states[guild_id] = RadioState(guild_id, self.library)
+        return self.states[guild_id]
+
+    def all(self):
+        return list(self.states.values())
+
+    def connected(self):
+        return [s for s in self.states.values() if s.voice_client and s.voice_client.is_connected()]
+
+    def add_to_playlist(self, song):
+        if not self.library.add(song): return False
+        for state in self.all(): state.song_added(song)
+        return True
+
+    def add_many_to_playlist(self, songs):
+        added = self.library.add_many(songs)
+        for state in self.all():
+            for song in added: state.song_added(song)
+        return added
+
+    def remove_from_playlist(self, query):
+        removed = self.library.remove(query)
+        for state in self.all(): state.songs_removed(removed)
+        return len(removed)
+
+quarantine = Quarantine(QUARANTINE_FILE, threshold=QUARANTINE_AFTER)
+radios = RadioRegistry(Library())
+stream_cache = StreamCache(STREAM_CACHE_FILE)
+instance_health = InstanceHealth(INSTANCE_HEALTH_FILE)
+ytdl_pool = YtdlPool(YTDL_OPTS, workers=YTDL_WORKERS, max_queue=YTDL_MAX_QUEUE, timeout=YTDL_TIMEOUT)
+audio_cache = AudioCache(AUDIO_CACHE_DIR, max_bytes=AUDIO_CACHE_MAX_MB * 1024**2) if AUDIO_CACHE_MODE else None
+loudness = r128.LoudnessIndex(LOUDNESS_FILE, target=LOUDNESS_TARGET) if LOUDNESS_MODE else None
+asset_bank = AssetBank() if ASSET_BANK_MODE else None
+anthem_armed_for = None  # Fecha (Berlín) cuya medianoche ya tiene el himno armado
+scheduler = None  # AsyncIOScheduler, creado en on_ready (apscheduler se importa allí)
+startup.mark("estado")
+
+def report_loop_lag(lag):
+    metrics.LOOP_LAG_SECONDS.observe(lag)
+    metrics.LOOP_LAG_CURRENT.set(lag)
+
+def report_loop_stall(lag, stack):
+    metrics.LOOP_STALLS.inc()
+    print(f"🐢 Event loop bloqueado {lag * 1000:.0f} ms. Pila del bloqueo:\n" + "".join(stack[-8:]))
+
+loop_watchdog = LoopWatchdog(interval=LOOP_WATCHDOG_INTERVAL, threshold=LOOP_STALL_THRESHOLD,
+                             on_lag=report_loop_lag, on_stall=report_loop_stall)
+profiler = SamplingProfiler(interval=PROFILER_INTERVAL)
 
 # ---------------- HELPERS ----------------
+weather_cache = {}  # city -> (timestamp, texto)
+news_cache = {"etag": None, "modified": None, "text": None}
+
+async def get_city_weather(city):
+    cached = weather_cache.get(city)
+    fresh = cached and time.time() - cached[0] < WEATHER_TTL
+    metrics.CACHE_REQUESTS.inc(cache="weather", result="hit" if fresh else "miss")
+    if fresh: return cached[1]
+    try:
+        url = WEATHER_URL.format(city=city)
+        async with get_http_session().get(url, timeout=aiohttp.ClientTimeout(total=5)) as resp:
+            if resp.status == 200:
+                text = await resp.text()
+                cleaned = text.strip()
+                weather_cache[city] = (time.time(), cleaned)
+                return cleaned
+    except Exception: pass
+    # Mejor el dato anterior que nada
+    return cached[1] if cached else None
+
 async def get_weather_text():
-    reports = []
-    async with aiohttp.ClientSession() as session:
-        for city in CITIES:
-            try:
-                url = f"https://wttr.in/{city}?format=%t+%C"
-                async with session.get(url) as resp:
-                    if resp.status == 200:
-                        text = await resp.text()
-                        cleaned = text.strip()
-                        reports.append(f"{city}: {cleaned}")
-            except: continue
+    # Todas las ciudades a la vez; cada una con su timeout y su caché
+    results = await asyncio.gather(*(get_city_weather(city) for city in CITIES))
+    reports = [f"{city}: {text}" for city, text in zip(CITIES, results) if text]
     return " . ".join(reports)
 
 async def get_berlin_news():
+    # GET condicional (ETag / If-Modified-Since): si el feed no cambió, 304 y reutilizamos el texto.
+    # feedparser es bloqueante, así que el parseo va al executor.
+    headers = {}
+    if news_cache["etag"]: headers["If-None-Match"] = news_cache["etag"]
+    if news_cache["modified"]: headers["If-Modified-Since"] = news_cache["modified"]
     try:
-        feed = feedparser.parse(NEWS_FEED)
+        async with get_http_session().get(NEWS_FEED, headers=headers, timeout=aiohttp.ClientTimeout(total=10)) as resp:
+            if resp.status == 304 and news_cache["text"]:
+                return news_cache["text"]
+            if resp.status != 200:
+                return news_cache["text"] or ""
+            body = await resp.read()
+            etag, modified = resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+        loop = asyncio.get_event_loop()
+        feedparser = await loop.run_in_executor(None, importlib.import_module, "feedparser")
+        feed = await loop.run_in_executor(None, feedparser.parse, body)
         if feed.entries:
             entry = feed.entries[0]
             clean_desc = entry.description.split('<')[0]
-            return f"Nachrichten aus Berlin: {entry.title}. {clean_desc[:200]}"
-    except: return ""
+            news_cache["text"] = f"Nachrichten aus Berlin: {entry.title}. {clean_desc[:200]}"
+            # Las cabeceras solo valen si el texto quedó guardado; si no, un 304 dejaría la caché vacía para siempre
+            news_cache["etag"], news_cache["modified"] = etag, modified
+            return news_cache["text"]
+    except Exception: return news_cache["text"] or ""
     return "Keine aktuellen Nachrichten."
 
-async def generate_tts(text, filename="tts_temp.mp3"):
+async def generate_tts(text):
+    # Un archivo por texto (hash del contenido): renderizar uno nuevo nunca pisa
+    # el que está sonando, y el mismo texto no se vuelve a sintetizar.
+    os.makedirs(TTS_DIR, exist_ok=True)
+    filename = os.path.join(TTS_DIR, hashlib.sha1(text.encode()).hexdigest()[:16] + ".mp3")
+    if os.path.exists(filename): return filename
+    tmp = filename + ".part"
+    import edge_tts  # Diferido; warm_up() lo precarga fuera del loop
     communicate = edge_tts.Communicate(text, "de-DE-ConradNeural")
-    await communicate.save(filename)
+    with metrics.TTS_RENDER_SECONDS.time():
+        await communicate.save(tmp)
+    os.replace(tmp, filename)
     return filename
 
-# ---------------- STREAM EXTRACTORS ----------------
+def cleanup_tts(keep=()):
+    # Borra audios TTS viejos, salvo los que siguen en uso
+    if not os.path.isdir(TTS_DIR): return
+    now = time.time()
+    for name in os.listdir(TTS_DIR):
+        path = os.path.join(TTS_DIR, name)
+        if path in keep: continue
+        try:
+            if now - os.path.getmtime(path) > TTS_MAX_AGE: os.remove(path)
+        except OSError: pass
 
-async def get_stream_from_invidious(video_id):
-    instances = [
-        "https://inv.tux.pizza",
-        "https://invidious.jing.rocks",
-        "https://inv.nadeko.net",
-        "https://invidious.nerdvpn.de"
-    ]
-    async with aiohttp.ClientSession() as session:
-        for base_url in instances:
-            try:
-                print(f"🔄 Invidious API: {base_url}")
-                url = f"{base_url}/api/v1/videos/{video_id}"
-                async with session.get(url, timeout=5) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        if "formatStreams" in data:
-                            # Prefer m4a/mp4 per compatibility
-                            formats = data["formatStreams"]
-                            best = sorted(formats, key=lambda x: x.get("bitrate", "0") or 0, reverse=True)[0]
-                            return best["url"]
-            except: continue
+# ---------------- BULLETINS ----------------
+bulletin_lock = asyncio.Lock()
+
+async def render_bulletin():
+    # Lo llama el scheduler cada BULLETIN_REFRESH_MINUTES: deja el boletín listo antes de necesitarlo
+    async with bulletin_lock:
+        weather = await get_weather_text()
+        news = await get_berlin_news()
+        full_text = f"Das Wetter. {weather}. Und nun die Nachrichten. {news}. Weiter geht es mit Musik."
+        try:
+            radios.ready_bulletin = await generate_tts(full_text)
+            print(f"🎙️ Boletín listo: {radios.ready_bulletin}")
+            if loudness: asyncio.create_task(analyse_file(radios.ready_bulletin))
+        except Exception as e:
+            print(f"❌ Error renderizando boletín: {e}")
+        cleanup_tts(keep=[radios.ready_bulletin] + [s.next_tts_file for s in radios.all()])
+        return radios.ready_bulletin
+
+async def get_bulletin():
+    # El boletín pre-renderizado si existe; si no (arranque, fallo), se renderiza ahora
+    if radios.ready_bulletin and os.path.exists(radios.ready_bulletin):
+        return radios.ready_bulletin
+    return await render_bulletin()
+
+# ---------------- HEDGING ----------------
+async def hedge(factories, delay):
+    # Lanza las corrutinas escalonadas cada `delay` segundos (antes si la anterior falla).
+    # Gana el primer resultado válido y se cancela todo lo que siga en vuelo.
+    pending = list(factories)
+    running = set()
+    try:
+        while pending or running:
+            if pending:
+                running.add(asyncio.create_task(pending.pop(0)()))
+            done, running = await asyncio.wait(running, timeout=delay if pending else None, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and task.exception() is None and task.result():
+                    return task.result()
+    finally:
+        for task in running: task.cancel()
+    return None
+
+async def first_instance(fetchers):
+    # Según RESOLVER_MODE: instancias una tras otra o en paralelo escalonado
+    if RESOLVER_MODE == "hedged":
+        return await hedge(fetchers, HEDGE_DELAY)
+    for fetch in fetchers:
+        result = await fetch()
+        if result: return result
     return None
 
+# ---------------- INSTANCE HEALTH ----------------
+async def tracked(instance, fetch):
+    # Mide latencia y resultado de una llamada a una instancia para el registro de salud
+    start = time.monotonic()
+    result = await fetch()  # Si el hedge la cancela, no cuenta ni como éxito ni como fallo
+    latency = time.monotonic() - start
+    metrics.INSTANCE_SECONDS.observe(latency, instance=instance, result="ok" if result else "fail")
+    if result: instance_health.record_success(instance, latency)
+    else: instance_health.record_failure(instance, latency)
+    return result
+
+async def probe_instance(instance):
+    # Petición barata para ver si una instancia con el circuito abierto ha revivido
+    if instance in INVIDIOUS_INSTANCES: url = f"{instance}/api/v1/stats"
+    elif instance in PIPED_INSTANCES: url = f"{instance}/healthcheck"
+    else: url = instance.split("/api/")[0] + "/"
+    try:
+        async with get_http_session().get(url, timeout=aiohttp.ClientTimeout(total=5)) as resp:
+            return resp.status < 500
+    except Exception: return False
+
+async def instance_health_monitor():
+    await bot.wait_until_ready()
+    all_instances = COBALT_INSTANCES + INVIDIOUS_INSTANCES + PIPED_INSTANCES
+    while not bot.is_closed():
+        for instance in instance_health.open_instances(all_instances):
+            if not instance_health.is_open(instance):  # Cooldown cumplido: half-open
+                alive = await tracked(instance, lambda i=instance: probe_instance(i))
+                print(f"🩺 Sonda {instance}: {'OK' if alive else 'sigue caída'}")
+        instance_health.save()
+        await asyncio.sleep(60)
+
 # ---------------- STREAM EXTRACTORS ----------------
-async def get_stream_from_cobalt(url):
-    api_url = "https://api.cobalt.tools/api/json"
+async def fetch_invidious(base_url, video_id):
+    try:
+        print(f"🔄 Invidious API: {base_url}")
+        url = f"{base_url}/api/v1/videos/{video_id}"
+        async with get_http_session().get(url, timeout=aiohttp.ClientTimeout(total=5)) as resp:
+            if resp.status == 200:
+                data = await resp.json()
+                if "formatStreams" in data:
+                    # Prefer m4a/mp4 per compatibility
+                    formats = data["formatStreams"]
+                    best = sorted(formats, key=lambda x: x.get("bitrate", "0") or 0, reverse=True)[0]
+                    return best["url"]
+    except Exception: pass
+    return None
+
+async def get_stream_from_invidious(video_id):
+    instances = instance_health.ordered(INVIDIOUS_INSTANCES)
+    return await first_instance([lambda b=base_url: tracked(b, lambda: fetch_invidious(b, video_id)) for base_url in instances])
+
+async def fetch_cobalt(api_url, url):
     headers = {"Accept": "application/json", "Content-Type": "application/json"}
     payload = {"url": url, "isAudioOnly": True}
     
-    async with aiohttp.ClientSession() as session:
-        try:
-            print(f"🔄 Cobalt API: {url}")
-            async with session.post(api_url, json=payload, headers=headers) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    if "url" in data: return data["url"]
-                    elif "picker" in data:
-                        for item in data["picker"]:
-                            if item.get("type") == "audio": return item["url"]
-        except Exception as e: print(f"Cobalt error: {e}")
+    try:
+        print(f"🔄 Cobalt API: {url}")
+        async with get_http_session().post(api_url, json=payload, headers=headers) as resp:
+            if resp.status == 200:
+                data = await resp.json()
+                if "url" in data: return data["url"]
+                elif "picker" in data:
+                    for item in data["picker"]:
+                        if item.get("type") == "audio": return item["url"]
+    except Exception as e: print(f"Cobalt error: {e}")
+    return None
+
+async def get_stream_from_cobalt(url):
+    instances = instance_health.ordered(COBALT_INSTANCES)
+    return await first_instance([lambda a=api_url: tracked(a, lambda: fetch_cobalt(a, url)) for api_url in instances])
+
+async def fetch_piped(base_url, video_id):
+    try:
+        print(f"🔄 Piped API: {base_url}")
+        url = f"{base_url}/streams/{video_id}"
+        async with get_http_session().get(url, timeout=aiohttp.ClientTimeout(total=5)) as resp:
+            if resp.status == 200:
+                data = await resp.json()
+                audio_streams = data.get("audioStreams", [])
+                if not audio_streams: return None
+                best_audio = sorted(audio_streams, key=lambda x: x.get("bitrate", 0), reverse=True)[0]
+                return best_audio["url"]
+    except Exception: pass
     return None
 
 async def get_stream_from_piped(video_id):
-    instances = [
-        "https://pipedapi.kavin.rocks",
-        "https://pipedapi.leptons.xyz",
-        "https://api.piped.privacy.com.de"
-    ]
-    async with aiohttp.ClientSession() as session:
-        for base_url in instances:
-            try:
-                print(f"🔄 Piped API: {base_url}")
-                url = f"{base_url}/streams/{video_id}"
-                async with session.get(url, timeout=5) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        audio_streams = data.get("audioStreams", [])
-                        if not audio_streams: continue
-                        best_audio = sorted(audio_streams, key=lambda x: x.get("bitrate", 0), reverse=True)[0]
-                        return best_audio["url"]
-            except: continue
+    instances = instance_health.ordered(PIPED_INSTANCES)
+    return await first_instance([lambda b=base_url: tracked(b, lambda: fetch_piped(b, video_id)) for base_url in instances])
+
+# ---------------- STREAM RESOLUTION ----------------
+async def probe_stream_url(url):
+    # Comprobación barata: pedimos 1 byte. Una URL caducada de googlevideo da 403.
+    try:
+        async with get_http_session().get(url, headers={"Range": "bytes=0-0"}, timeout=aiohttp.ClientTimeout(total=3)) as resp:
+            return resp.status in (200, 206)
+    except: return False
+
+resolving = {}  # song_url -> Task: varios servidores pidiendo la misma canción comparten resolución
+
+async def resolve_stream(song_url):
+    # Devuelve (stream_url, title). stream_url es None si todas las estrategias fallan.
+    task = resolving.get(song_url)
+    if not task:
+        task = asyncio.create_task(resolve_stream_shared(song_url))
+        resolving[song_url] = task
+        task.add_done_callback(lambda _: resolving.pop(song_url, None))
+    return await asyncio.shield(task)
+
+async def resolve_stream_shared(song_url):
+    vid = extract_video_id(song_url)
+    cached = stream_cache.get(vid) if vid else None
+    if cached:
+        if not STREAM_CACHE_PROBE or await probe_stream_url(cached["url"]):
+            print(f"💾 Caché: {cached['title']} ({cached['source']})")
+            metrics.CACHE_REQUESTS.inc(cache="stream", result="hit")
+            return cached["url"], cached["title"]
+        print(f"🗑️ Caché inválida para {vid}. Resolviendo de nuevo...")
+        metrics.CACHE_REQUESTS.inc(cache="stream", result="stale")
+        stream_cache.drop(vid)
+    else:
+        metrics.CACHE_REQUESTS.inc(cache="stream", result="miss")
+
+    stream_url, title, source = await resolve_stream_uncached(song_url)
+    if stream_url and vid:
+        stream_cache.put(vid, stream_url, title, source)
+        # Solo YTDL devuelve el título real del vídeo
+        if source and source.startswith("ytdl"): radios.library.store.set_metadata(vid, title=title)
+    return stream_url, title
+
+# Cada estrategia devuelve (stream_url, title, source) o None
+async def strategy_cobalt(song_url):
+    if "youtube.com" not in song_url and "youtu.be" not in song_url: return None
+    stream_url = await get_stream_from_cobalt(song_url)
+    return (stream_url, "Radio Play (Cobalt)", "cobalt") if stream_url else None
+
+async def strategy_invidious(song_url):
+    vid = extract_video_id(song_url)
+    stream_url = await get_stream_from_invidious(vid) if vid else None
+    return (stream_url, "Radio Play (Invidious)", "invidious") if stream_url else None
+
+async def strategy_piped(song_url):
+    vid = extract_video_id(song_url)
+    stream_url = await get_stream_from_piped(vid) if vid else None
+    return (stream_url, "Radio Play (Piped)", "piped") if stream_url else None
+
+def remember_duration(song_url, data):
+    # yt-dlp da la duración: la guardamos para que el modo gapless sepa cuándo preparar la siguiente
+    vid = extract_video_id(song_url)
+    if vid and data.get('duration'): radios.library.store.set_metadata(vid, duration=int(data['duration']))
+
+async def strategy_ytdl(song_url):
+    # LOCAL YTDL + PROXY ROTATION (Fallback principal con cookies)
+    # Try without proxy first
+    try:
+        print(f"🕵️ Intentando extraer info con YTDL para: {song_url}")
+        data = await ytdl_pool.extract(song_url)
+        if 'entries' in data: data = data['entries'][0]
+        stream_url = data['url']; title = data.get('title', 'Unknown')
+        remember_duration(song_url, data)
+        print(f"✅ YTDL Éxito: {title} | URL: {stream_url[:40]}...")
+        return stream_url, title, "ytdl"
+    except YtdlQueueFull:
+        raise  # Pool saturado: no es culpa de la canción (ver resolve_stream_uncached)
+    except Exception as e:
+        print(f"❌ YTDL Error Crítico: {e}")
+    # Try with proxies
+    for proxy in PROXIES:
+        print(f"trying proxy: {proxy}")
+        try:
+            data = await ytdl_pool.extract(song_url, proxy=proxy)
+            if 'entries' in data: data = data['entries'][0]
+            stream_url = data['url']; title = data.get('title', 'Unknown')
+            remember_duration(song_url, data)
+            print("✅ Proxy funcionó!")
+            return stream_url, title, "ytdl-proxy"
+        except YtdlQueueFull: raise
+        except: continue
     return None
 
-def extract_video_id(url):
-    if "v=" in url: return url.split("v=")[1].split("&")[0]
-    elif "youtu.be/" in url: return url.split("youtu.be/")[1].split("?")[0]
+STRATEGIES = {
+    "cobalt": strategy_cobalt,
+    "invidious": strategy_invidious,
+    "piped": strategy_piped,
+    "ytdl": strategy_ytdl,
+}
+
+async def timed_strategy(name, song_url):
+    # Latencia por estrategia; una estrategia cancelada por el hedge no se cuenta
+    start = time.perf_counter()
+    result = await STRATEGIES[name](song_url)
+    metrics.RESOLVER_SECONDS.observe(time.perf_counter() - start, strategy=name, result="ok" if result else "fail")
+    return result
+
+async def resolve_stream_uncached(song_url, skip=()):
+    # Estrategias en el orden de RESOLVER_PRIORITY (menos las de `skip`). Devuelve (stream_url, title, source).
+    # Si nada dio stream y el pool de YTDL estaba lleno, lanza YtdlQueueFull: hay que reintentar, no culpar a la canción.
+    overloaded = []
+    async def attempt(name, u):
+        try:
+            return await timed_strategy(name, u)
+        except YtdlQueueFull as e:
+            overloaded.append(e)
+            return None
+    strategies = [lambda u, name=name: attempt(name, u)
+                  for name in RESOLVER_PRIORITY if name in STRATEGIES and name not in skip]
+    result = None
+    if RESOLVER_MODE == "hedged":
+        # Todas en paralelo, escalonadas: la preferida sigue ganando si responde rápido.
+        # Nota: un YTDL ya lanzado en el executor termina igualmente, solo se ignora su resultado.
+        result = await hedge([lambda f=f: f(song_url) for f in strategies], HEDGE_DELAY)
+    else:
+        for strategy in strategies:
+            result = await strategy(song_url)
+            if result: break
+    if not result and overloaded: raise overloaded[0]
+    return result or (None, "Radio Stream", None)
+
+# ---------------- PREFETCH ----------------
+def schedule_prefetch(state):
+    # Resuelve en segundo plano las próximas PREFETCH_AHEAD canciones.
+    # Si la cola cambió (:play, :delete...), las precargas que ya no tocan se descartan.
+    wanted = state.peek_next_songs(PREFETCH_AHEAD) if PREFETCH_AHEAD > 0 else []
+    wanted = [s for s in wanted if not is_cached_locally(s)]
+    for song_url in list(state.prefetch_tasks):
+        if song_url not in wanted:
+            state.prefetch_tasks.pop(song_url).cancel()
+    for song_url in wanted:
+        if song_url not in state.prefetch_tasks:
+            print(f"⏳ Precargando: {song_url}")
+            state.prefetch_tasks[song_url] = asyncio.create_task(prefetch(song_url))
+
+async def prefetch(song_url):
+    try:
+        stream_url, title = await resolve_stream(song_url)
+    except YtdlQueueFull:
+        return None  # YTDL saturado: se resolverá al tocarle
+    return stream_url, title, time.time()
+
+def prefetch_fresh(song_url, stream_url, resolved_at):
+    # Una precarga puede llevar horas esperando (warm-up, :leave y vuelta): solo vale si la caché
+    # de streams sigue dando esa misma URL (la caché ya descarta las caducadas) o, sin video_id, si no caducó
+    vid = extract_video_id(song_url)
+    if vid:
+        cached = stream_cache.get(vid)
+        return bool(cached) and cached["url"] == stream_url
+    return url_expiry(stream_url, now=resolved_at) - EXPIRY_MARGIN > time.time()
+
+async def take_prefetched(state, song_url):
+    task = state.prefetch_tasks.pop(song_url, None)
+    if not task:
+        metrics.CACHE_REQUESTS.inc(cache="prefetch", result="miss")
+        return None
+    try:
+        prefetched = await task
+    except Exception as e:
+        print(f"❌ Precarga falló: {e}")
+        return None
+    if not prefetched:
+        metrics.CACHE_REQUESTS.inc(cache="prefetch", result="miss")
+        return None
+    stream_url, title, resolved_at = prefetched
+    if stream_url and not prefetch_fresh(song_url, stream_url, resolved_at):
+        print(f"🗑️ Precarga caducada: {song_url}. Resolviendo de nuevo...")
+        metrics.CACHE_REQUESTS.inc(cache="prefetch", result="stale")
+        return None
+    metrics.CACHE_REQUESTS.inc(cache="prefetch", result="hit")
+    print(f"⚡ Precargado {'listo' if stream_url else 'sin resultado'}: {song_url}")
+    return stream_url, title
+
+# ---------------- LOCAL AUDIO CACHE ----------------
+def is_cached_locally(song_url):
+    vid = extract_video_id(song_url)
+    return bool(audio_cache and vid and vid in audio_cache)
+
+def cached_audio(song_url):
+    # (ruta, título) si la canción está en la caché local de audio
+    vid = extract_video_id(song_url)
+    if not audio_cache or not vid: return None
+    local = audio_cache.get(vid)
+    metrics.CACHE_REQUESTS.inc(cache="audio", result="hit" if local else "miss")
+    return local
+
+async def audio_cache_filler():
+    # Descarga en segundo plano las canciones de la playlist permanente, una por ronda.
+    # Las que van a sonar pronto tienen prioridad y pueden expulsar otras (LRU);
+    # el resto solo se descarga mientras quede presupuesto libre.
+    await bot.wait_until_ready()
+    while not bot.is_closed():
+        playlist = radios.library.permanent_playlist
+        known = set(playlist)
+        upcoming = [s for st in radios.connected() for s in st.peek_next_songs(PREFETCH_AHEAD) if s in known]
+        for song_url in upcoming + playlist:
+            vid = extract_video_id(song_url)
+            if not vid or vid in audio_cache: continue
+            if audio_cache.is_full() and song_url not in upcoming: continue
+            try:
+                stream_url, title = await resolve_stream(song_url)
+            except YtdlQueueFull:
+                break  # YTDL saturado: a la próxima ronda
+            if stream_url: await audio_cache.download(vid, stream_url, title)
+            break
+        audio_cache.save()
+        await asyncio.sleep(30)
+
+# ---------------- LOUDNESS ----------------
+def loudness_gain(song_url=None, path=None):
+    # Ganancia precalculada en dB, o None si no está medida o es tan pequeña que no merece filtro
+    if not loudness: return None
+    if song_url:
+        vid = extract_video_id(song_url)
+        key = r128.song_key(vid) if vid else None
+    else:
+        try: key = loudness.file_key(path)
+        except OSError: key = None
+    gain = loudness.gain(key) if key else None
+    metrics.CACHE_REQUESTS.inc(cache="loudness", result="miss" if gain is None else "hit")
+    return gain if gain is not None and abs(gain) >= LOUDNESS_MIN_GAIN else None
+
+async def analyse_loudness(key, src, kind, before_options=()):
+    try:
+        result = await r128.measure(src, before_options)
+    except Exception as e:
+        print(f"⚠️ Análisis de sonoridad falló ({e})")
+        result = None
+    metrics.LOUDNESS_ANALYSES.inc(kind=kind, result="ok" if result else "error")
+    if not result: return False
+    loudness.record(key, *result)
+    print(f"🔊 {key}: {result[0]:.1f} LUFS → {loudness.gain(key):+.1f} dB")
+    return True
+
+async def analyse_file(path):
+    if not path or not os.path.exists(path): return False
+    key = loudness.file_key(path)
+    return key in loudness or await analyse_loudness(key, path, "file")
+
+async def analyse_song(song_url, vid):
+    # Mejor desde la caché local de audio; si no, ffmpeg lee el stream entero (una sola vez por canción)
+    local = audio_cache.get(vid) if is_cached_locally(song_url) else None
+    if local: return await analyse_loudness(r128.song_key(vid), local[0], "song")
+    stream_url, _ = await resolve_stream(song_url)
+    if not stream_url: return False
+    return await analyse_loudness(r128.song_key(vid), stream_url, "song", FFMPEG_OPTS['before_options'].split())
+
+async def loudness_analyser():
+    # De una en una: himno y boletín listo primero, luego lo que va a sonar pronto y el resto de la playlist
+    await bot.wait_until_ready()
+    failed = set()  # Sin resolver o sin audio: no se reintenta hasta reiniciar
+    while not bot.is_closed():
+        for path in (DEUTSCHLAND_FILE, radios.ready_bulletin): await analyse_file(path)
+        upcoming = [s for st in radios.connected() for s in st.peek_next_songs(PREFETCH_AHEAD)]
+        for song_url in upcoming + radios.library.permanent_playlist:
+            vid = extract_video_id(song_url)
+            if not vid or vid in failed or r128.song_key(vid) in loudness: continue
+            try:
+                if not await analyse_song(song_url, vid): failed.add(vid)
+            except YtdlQueueFull:
+                pass  # YTDL saturado: no cuenta como fallo, se reintenta en la próxima ronda
+            break
+        await asyncio.sleep(LOUDNESS_INTERVAL)
+
+# ---------------- AUDIO SOURCES ----------------
+def guess_codec(src):
+    # Intenta saber el códec sin ffprobe: archivos locales por extensión,
+    # googlevideo por mime/itag (249/250/251 = webm/opus, 139/140/141 = m4a/aac)
+    lowered = src.lower()
+    if lowered.endswith((".ogg", ".opus", ".webm")): return "opus"
+    if lowered.endswith((".mp3", ".m4a", ".aac")): return "other"
+    if "googlevideo.com" in lowered:
+        itag = re.search(r"[?&/]itag[=/](\d+)", lowered)
+        if "mime=audio%2fwebm" in lowered or (itag and itag.group(1) in ("249", "250", "251")):
+            return "opus"
+        if "mime=audio%2fmp4" in lowered or (itag and itag.group(1) in ("139", "140", "141")):
+            return "other"
     return None
 
+async def make_source(src, stream=False, seek=None, gain=None):
+    # stream=True para URLs remotas (reconexión de ffmpeg); seek = segundo por el que empezar;
+    # gain = dB precalculados por el índice de sonoridad
+    opts = dict(FFMPEG_OPTS) if stream else {'options': '-vn'}
+    if seek: opts['before_options'] = f"{opts.get('before_options', '')} -ss {seek:.2f}".strip()
+    if gain: opts['options'] = f"{opts['options']} -af volume={gain:.2f}dB"
+    if PLAYBACK_MODE != "opus":
+        return discord.FFmpegPCMAudio(src, **opts)
+    codec = guess_codec(src)
+    if codec is None:
+        try:
+            codec, _ = await discord.FFmpegOpusAudio.probe(src, method='fallback')
+        except Exception as e:
+            print(f"⚠️ No se pudo detectar el códec ({e}). Transcodificando.")
+    # codec 'opus' => '-c:a copy'; cualquier otro => ffmpeg codifica con libopus.
+    # Con ganancia no hay copia posible: el filtro obliga a recodificar.
+    passthrough = codec == "opus" and not gain
+    if passthrough: print("🎚️ Opus passthrough (sin recodificar)")
+    return discord.FFmpegOpusAudio(src, codec="opus" if passthrough else None, **opts)
+
 # ---------------- PLAYBACK LOGIC ----------------
-async def play_next(ctx_or_vc):
-    vc = state.voice_client
-    if not vc or not vc.is_connected(): return
+def record_gap(state, gap):
+    state.gaps.append(gap)
+    metrics.TRACK_GAP.observe(gap)
+    avg = sum(state.gaps) / len(state.gaps)
+    print(f"⏱️ Hueco entre pistas: {gap * 1000:.0f} ms (media {avg * 1000:.0f} ms en {len(state.gaps)})")
 
-    if state.next_tts_message:
-        text, state.next_tts_message = state.next_tts_message, None
-        tts_file = await generate_tts(text)
-        vc.play(discord.FFmpegPCMAudio(tts_file), after=lambda e: bot.loop.create_task(play_next(ctx_or_vc)))
-        return
+def track_finished(state, error=None):
+    # Callback `after` del reproductor (se ejecuta en su hilo)
+    # Una pista que no dio audio no deja hueco que medir (saldría ~0 ms)
+    state.track_ended_at = time.perf_counter() if state.audio_started or not state.current_song else None
+    if error:
+        print(f"❌ Error del reproductor: {error}")
+        metrics.FFMPEG_FAILURES.inc(reason="player")
+    if state.current_song and not state.audio_started:
+        state.dead_song = state.current_song  # Terminó sin dar audio: lo contabiliza station_loop
+    # Desde otro hilo hay que pasar por call_soon_threadsafe, o el loop no se entera hasta el próximo evento
+    bot.loop.call_soon_threadsafe(play_next, state)
 
-    if state.song_counter > 0 and state.song_counter % 7 == 0:
-        state.song_counter += 1
-        weather = await get_weather_text()
-        news = await get_berlin_news()
-        full_text = f"Das Wetter. {weather}. Und nun die Nachrichten. {news}. Weiter geht es mit Musik."
-        state.next_tts_message = full_text
-        await play_next(ctx_or_vc)
-        return
+def new_track(kind, song_url=None, tts_file=None):
+    # Lo que viaja con cada pista por la cadena gapless (su `tag`)
+    return {"kind": kind, "song": song_url, "tts": tts_file, "picked_at": time.perf_counter(), "audio": False}
 
-    song_url = state.get_next_song()
-    if not song_url:
-        await asyncio.sleep(10); await play_next(ctx_or_vc); return
+def timed_source(state, source, track):
+    # Tiempo hasta el primer frame (time-to-first-audio) desde que se eligió la pista
+    def first_frame():
+        track["audio"] = True
+        if GAPLESS_MODE:
+            # Este frame va al pre-buffer, no al altavoz: TTFA lo anota gapless_track_started
+            if state.current_track is track: state.audio_started = True
+            return
+        state.audio_started = True
+        now = time.perf_counter()
+        metrics.TIME_TO_FIRST_AUDIO.observe(now - track["picked_at"], kind=track["kind"])
+        # Hueco real: del fin de la pista anterior a este frame (arranque de ffmpeg incluido)
+        ended, state.track_ended_at = state.track_ended_at, None
+        if ended: bot.loop.call_soon_threadsafe(record_gap, state, now - ended)
+    return TimedSource(source, first_frame)
 
-    print(f"🔍 Procesando: {song_url}")
-    stream_url = None
-    title = "Radio Stream"
+def gapless_track_started(state, title, track):
+    # La cadena acaba de pasar a esta pista: ahora sí es la pista en curso
+    state.current_track = track
+    state.current_song, state.audio_started = track["song"], track["audio"]
+    metrics.TIME_TO_FIRST_AUDIO.observe(time.perf_counter() - track["picked_at"], kind=track["kind"])
+    if title: bot.loop.create_task(bot.change_presence(activity=discord.Activity(type=discord.ActivityType.listening, name=title)))
 
-    # STRATEGY 1: COBALT
-    if not stream_url and ("youtube.com" in song_url or "youtu.be" in song_url):
-        stream_url = await get_stream_from_cobalt(song_url)
-        if stream_url: title = "Radio Play (Cobalt)"
+def gapless_track_ended(state, track):
+    # Fin de una pista dentro de la cadena (el reproductor sigue, no hay track_finished).
+    # Sin audio => pista muerta: station_loop la contabiliza y aplica el backoff antes de encolar otra.
+    if not track["song"]: return
+    if not track["audio"]:
+        state.dead_song = track["song"]
+    else:
+        quarantine.record_success(track["song"])
+        state.failures = 0
 
-    # STRATEGY 2: INVIDIOUS (Agregado)
-    if not stream_url:
-        vid = extract_video_id(song_url)
-        if vid:
-            stream_url = await get_stream_from_invidious(vid)
-            if stream_url: title = "Radio Play (Invidious)"
+def skip_track(state):
+    # En gapless se salta dentro de la cadena: parar el VoiceClient tiraría también la siguiente, ya pre-bufferizada
+    vc = state.voice_client
+    if state.gapless is not None and vc.source is state.gapless:
+        state.gapless.skip()
+    else:
+        vc.stop()
 
-    # STRATEGY 3: PIPED
-    if not stream_url:
+def stop_playback(state):
+    # Para lo que suene. Las pistas ya encoladas en la cadena gapless salieron de la cola/shuffle: vuelven a la cola
+    if state.gapless is not None:
+        for track in reversed(state.gapless.take_upcoming()):
+            if track["song"]: state.queue.insert(0, track["song"])
+            elif track["tts"] and not state.next_tts_file: state.next_tts_file = track["tts"]
+    vc = state.voice_client
+    if vc and vc.is_playing(): vc.stop()
+
+def monitored_source(source, song_url, stream_url, duration):
+    # Envuelve un stream remoto: si se atasca o se corta, failover() lo sustituye sin cortar la canción
+    current = {"url": stream_url}
+    def on_failure(reason, position):  # Hilo lector/reproductor
+        bot.loop.call_soon_threadsafe(lambda: bot.loop.create_task(failover(monitor, song_url, current, reason, position)))
+    monitor = MonitoredSource(source, on_failure, duration=duration, stall_timeout=MONITOR_STALL_TIMEOUT,
+                              silence_seconds=MONITOR_SILENCE_SECONDS, max_failovers=MONITOR_MAX_FAILOVERS)
+    return monitor
+
+async def failover(monitor, song_url, current, reason, position):
+    print(f"🩺 Stream {reason} a los {position:.0f}s. Re-resolviendo {song_url}...")
+    metrics.STREAM_FAILOVERS.inc(reason=reason)
+    try:
+        # La URL vieja suele estar caducada: fuera de la caché, y primero probamos otra estrategia
         vid = extract_video_id(song_url)
-        if vid:
-            stream_url = await get_stream_from_piped(vid)
-            if stream_url: title = "Radio Play (Piped)"
+        cached = stream_cache.get(vid) if vid else None
+        failed = cached["source"].split("-")[0] if cached and cached["url"] == current["url"] else None
+        if vid: stream_cache.drop(vid)
+        stream_url, title, source_name = await resolve_stream_uncached(song_url, skip={failed} if failed else ())
+        if not stream_url and failed:
+            stream_url, title, source_name = await resolve_stream_uncached(song_url)
+        if not stream_url:
+            print("❌ Failover sin stream. Pasamos a la siguiente.")
+            return monitor.give_up()
+        if vid: stream_cache.put(vid, stream_url, title, source_name)
+        current["url"] = stream_url
+        if monitor.ended: return  # La pista ya se paró (skip, himno...) mientras re-resolvíamos
+        if monitor.swap(await make_source(stream_url, stream=True, seek=position, gain=loudness_gain(song_url))):
+            print(f"✅ Reanudado en {position:.0f}s vía {source_name}")
+    except Exception as e:
+        print(f"❌ Failover falló: {e}")
+        monitor.give_up()
 
-    # STRATEGY 4: LOCAL YTDL + PROXY ROTATION (Fallback principal con cookies)
-    if not stream_url:
-        print("⚠️ APIs fallaron. Usando YTDL con Cookies...")
-        loop = asyncio.get_event_loop()
-        
-        # Try without proxy first
+def start_playback(state, source, track, title=None, duration=None):
+    # False si el VoiceClient está ocupado con otra fuente (el himno): la pista no se lanzó
+    vc = state.voice_client
+    if not GAPLESS_MODE:
+        if vc.is_playing(): return False
+        vc.play(source, after=lambda e: track_finished(state, e))  # El hueco lo anota timed_source
+        return True
+    # Gapless: una sola GaplessChain por conexión; cada pista se encola ya pre-bufferizada
+    chain = state.gapless
+    if chain is not None and vc.is_playing() and vc.source is chain:
+        chain.push(source, title, duration, track)
+        return True
+    if vc.is_playing(): return False  # Nada de cadenas huérfanas mientras suena otra cosa
+    chain = GaplessChain(
+        bot.loop,
+        on_need_next=lambda: play_next(state),
+        on_track_start=lambda title, track: gapless_track_started(state, title, track),
+        on_track_end=lambda track: gapless_track_ended(state, track),
+        on_gap=lambda g: record_gap(state, g),
+        is_opus=PLAYBACK_MODE == "opus",
+        lead=GAPLESS_LEAD,
+        crossfade=GAPLESS_CROSSFADE,
+        prebuffer_frames=GAPLESS_PREBUFFER_FRAMES,
+    )
+    chain.push(source, title, duration, track)
+    try:
+        vc.play(chain, after=lambda e: track_finished(state, e))
+    except Exception:
+        chain.cleanup()  # También la pista ya pre-bufferizada
+        raise
+    state.gapless = chain  # Solo una cadena que de verdad suena
+    return True
+
+def play_next(state):
+    # Pide la siguiente pista al bucle de la emisora (lo arranca si no existe)
+    if state.player is None or state.player.done():
+        state.player = asyncio.get_running_loop().create_task(station_loop(state))
+    state.wake.set()
+
+def backoff_delay(failures):
+    # El primer fallo se reintenta ya (otra canción); luego 2, 4, 8... hasta BACKOFF_MAX
+    return 0 if failures <= 1 else min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (failures - 2))
+
+async def rest(state, delay):
+    # Espera `delay` s, o menos si alguien pide pista antes (:play, :join...), y reintenta
+    try:
+        await asyncio.wait_for(state.wake.wait(), delay)
+    except asyncio.TimeoutError:
+        pass
+    state.wake.set()
+
+async def back_off(state):
+    delay = backoff_delay(state.failures)
+    if delay: print(f"⏳ {state.failures} fallos seguidos. Reintento en {delay:.1f}s")
+    await rest(state, delay)
+
+def note_failure(state, song_url, reason):
+    metrics.TRACK_FAILURES.inc(reason=reason)
+    if state.failures >= OUTAGE_STREAK: return  # Caída general, no culpa de la canción
+    if quarantine.record_failure(song_url, reason):
+        print(f"🚧 En cuarentena tras {QUARANTINE_AFTER} fallos ({reason}): {song_url}")
+        for state in radios.all(): state.songs_removed({song_url})
+        metrics.QUARANTINED.set(len(quarantine))
+
+async def station_loop(state):
+    # Un único bucle por emisora: sin recursión y con memoria constante por muchas pistas que fallen
+    while True:
+        await state.wake.wait()
+        state.wake.clear()
+        vc = state.voice_client
+        if not vc or not vc.is_connected(): break
+
+        # Balance de la pista anterior
+        if state.dead_song:
+            song, state.dead_song = state.dead_song, None
+            print(f"⚠️ Sin audio: {song}. Saltando...")
+            metrics.FFMPEG_FAILURES.inc(reason="silence")
+            metrics.SKIPS.inc(reason="silence")
+            note_failure(state, song, "no_audio")
+            state.failures += 1
+            await back_off(state)  # Igual que si no se hubiera resuelto: nada de encadenar pistas muertas
+            continue
+        elif state.audio_started:
+            if state.current_song: quarantine.record_success(state.current_song)
+            state.failures = 0
+
+        # Ya suena algo (himno, petición repetida). En gapless solo se sigue si lo que suena es la cadena.
+        if vc.is_playing() and not (GAPLESS_MODE and vc.source is state.gapless): continue
         try:
-            print(f"🕵️ Intentando extraer info con YTDL para: {song_url}")
-            data = await loop.run_in_executor(None, lambda: yt_dlp.YoutubeDL(YTDL_OPTS).extract_info(song_url, download=False))
-            if 'entries' in data: data = data['entries'][0]
-            stream_url = data['url']; title = data.get('title', 'Unknown')
-            print(f"✅ YTDL Éxito: {title} | URL: {stream_url[:40]}...")
+            outcome = await play_one(state)
         except Exception as e:
-            print(f"❌ YTDL Error Crítico: {e}")
-            # Try with proxies
-            for proxy in PROXIES:
-                print(f"trying proxy: {proxy}")
-                PROXY_OPTS = YTDL_OPTS.copy()
-                PROXY_OPTS['proxy'] = proxy
-                try:
-                    data = await loop.run_in_executor(None, lambda: yt_dlp.YoutubeDL(PROXY_OPTS).extract_info(song_url, download=False))
-                    if 'entries' in data: data = data['entries'][0]
-                    stream_url = data['url']; title = data.get('title', 'Unknown')
-                    print("✅ Proxy funcionó!")
-                    break
-                except: continue
-
-    if stream_url:
-        print(f"▶️ Reproduciendo: {title}")
-        print(f"🔗 Link: {stream_url[:50]}...")
+            print(f"❌ Error en el bucle de reproducción: {e}")
+            outcome = "failed"
+        if outcome == "busy":
+            continue  # Cuando acabe lo que suena, track_finished vuelve a despertar el bucle
+        if outcome == "idle":
+            await rest(state, IDLE_RETRY)
+        elif outcome in ("failed", "overloaded"):
+            state.failures += 1
+            await back_off(state)
+    # Desconectada: lo precargado caducaría antes de volver, y las próximas se eligen de nuevo
+    for task in state.prefetch_tasks.values(): task.cancel()
+    state.prefetch_tasks.clear()
+    state.upcoming.clear()
+    state.player = None
+
+async def play_one(state):
+    # Arranca UNA pista. Devuelve "playing", "idle" (no hay canciones), "failed", "busy" (suena otra cosa)
+    # u "overloaded" (pool de YTDL lleno: la canción vuelve a la cola sin contar para la cuarentena)
+    if not state.next_tts_file and state.song_counter > 0 and state.song_counter % 7 == 0:
         state.song_counter += 1
-        SAFE_FFMPEG = {'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5', 'options': '-vn'}
-        source = discord.FFmpegPCMAudio(stream_url, **SAFE_FFMPEG)
-        vc.play(source, after=lambda e: bot.loop.create_task(play_next(ctx_or_vc)))
-        await bot.change_presence(activity=discord.Activity(type=discord.ActivityType.listening, name=title))
-        
-        await asyncio.sleep(2)
-        if not vc.is_playing():
-            print("⚠️ Silencio detectado. Saltando...")
-            vc.stop()
+        state.next_tts_file = await get_bulletin()
+
+    if state.next_tts_file:
+        tts_file, state.next_tts_file = state.next_tts_file, None
+        track = new_track("tts", tts_file=tts_file)
+        if not GAPLESS_MODE: state.current_song, state.audio_started = None, False
+        source = timed_source(state, await make_source(tts_file, gain=loudness_gain(path=tts_file)), track)
+        if not start_playback(state, source, track):
+            source.cleanup()
+            state.next_tts_file = tts_file
+            return "busy"
+        schedule_prefetch(state)
+        return "playing"
+
+    song_url = state.get_next_song()
+    if not song_url: return "idle"
+
+    track = new_track("stream", song_url)
+    print(f"🔍 Procesando: {song_url}")
+    local = cached_audio(song_url)
+    if local:
+        stream_url, title = local[0], local[1] or "Radio Play (Caché)"
     else:
+        try:
+            prefetched = await take_prefetched(state, song_url)
+            stream_url, title = prefetched or await resolve_stream(song_url)
+        except YtdlQueueFull as e:
+            print(f"⏳ {e}. {song_url} vuelve a la cola.")
+            metrics.TRACK_FAILURES.inc(reason="overloaded")
+            state.queue.insert(0, song_url)
+            return "overloaded"
+
+    state.song_counter += 1
+    if not stream_url:
         print("❌ Todo falló. Saltando canción...")
-        state.song_counter += 1
-        await asyncio.sleep(5)
-        await play_next(ctx_or_vc)
+        metrics.SKIPS.inc(reason="unresolved")
+        note_failure(state, song_url, "unresolved")
+        return "failed"
+
+    print(f"▶️ Reproduciendo: {title}")
+    print(f"🔗 Link: {stream_url[:50]}...")
+    try:
+        source = await make_source(stream_url, stream=not local, gain=loudness_gain(song_url))
+        if local: track["kind"] = "cache"
+        source = timed_source(state, source, track)
+        row = radios.library.store.get(song_url)
+        if MONITOR_STREAMS and not local:
+            source = monitored_source(source, song_url, stream_url, row["duration"] if row else None)
+        if not GAPLESS_MODE:  # En gapless la pista en curso la fija la cadena al empezarla
+            state.current_song, state.audio_started = song_url, False
+        if not start_playback(state, source, track, title, duration=row["duration"] if row else None):
+            source.cleanup()
+            if not GAPLESS_MODE: state.current_song = None
+            state.queue.insert(0, song_url)  # Vuelve a la cabeza de la cola: sonará al terminar el himno
+            return "busy"
+    except Exception as e:
+        print(f"❌ ffmpeg no arrancó: {e}")
+        metrics.FFMPEG_FAILURES.inc(reason="start")
+        note_failure(state, song_url, "ffmpeg")
+        return "failed"
+    schedule_prefetch(state)
+    if not GAPLESS_MODE:  # En gapless la cadena cambia la presencia al empezar la pista
+        await bot.change_presence(activity=discord.Activity(type=discord.ActivityType.listening, name=title))
+    return "playing"
 
 # ---------------- COMMANDS (GERMAN) ----------------
 @bot.command(name="deutschland")
 async def cmd_deutschland(ctx):
     if ctx.author.name != ADMIN_USER: return
-    await daily_deutschland()
+    await deutschland_in(ctx.guild)
 
 @bot.command(name="join")
 async def cmd_join(ctx):
+    state = radios.get(ctx.guild)
     if ctx.author.voice:
         try:
             # Aumentamos timeout a 60s y forzamos reconexión para entornos lentos (Render)
-            state.voice_client = await ctx.author.voice.channel.connect(timeout=60, reconnect=True, self_deaf=True)
+            vc = await ctx.author.voice.channel.connect(timeout=60, reconnect=True, self_deaf=True)
             await ctx.send(f"📻 Verbunden mit **{ctx.author.voice.channel.name}**")
-            await play_next(ctx)
+            if BROADCAST_MODE:
+                await listen_to_station(vc)
+            else:
+                state.voice_client = vc
+                play_next(state)
         except asyncio.TimeoutError:
             await ctx.send("❌ Error: Tiempo de espera agotado al conectar. Discord está lento o bloqueando la conexión UDP.")
         except Exception as e:
@@ -405,28 +1249,118 @@ async def cmd_join(ctx):
 @bot.command(name="addsong")
 async def cmd_addsong(ctx, *, query: str):
     if ctx.author.name != ADMIN_USER: return await ctx.send("⛔ Zugriff verweigert.")
-    state.add_to_playlist(query)
+    if not radios.add_to_playlist(query):
+        return await ctx.send(f"⚠️ Schon in der Liste: {query}")
     await ctx.send(f"✅ Hinzugefügt: {query}")
 
+async def check_video(video_id):
+    # oEmbed: barato y sin cookies. (video_id, título, estado) con estado ok | invalid | unchecked
+    params = {"url": importer.canonical_url(video_id), "format": "json"}
+    try:
+        async with get_http_session().get(OEMBED_URL, params=params, timeout=aiohttp.ClientTimeout(total=10)) as resp:
+            if resp.status == 200:
+                return video_id, (await resp.json()).get("title"), "ok"
+            if resp.status == 401: return video_id, None, "ok"  # Existe, pero sin inserción permitida
+            if resp.status in (400, 403, 404): return video_id, None, "invalid"
+    except Exception: pass
+    # 429/5xx/timeout: no descartamos una canción buena por un fallo pasajero
+    return video_id, None, "unchecked"
+
+async def expand_playlist(url):
+    # Extracción "flat": solo la lista de entradas (id, título, duración), sin resolver cada vídeo
+    info = await ytdl_pool.extract(url, timeout=IMPORT_PLAYLIST_TIMEOUT,
+                                   extra_opts={"extract_flat": "in_playlist", "noplaylist": False})
+    return [e for e in (info or {}).get("entries") or [] if e and e.get("id")]
+
+@bot.command(name="import")
+async def cmd_import(ctx, *, source: str = ""):
+    # :import <URL de playlist | URLs...>  o con un .txt adjunto (una URL por línea)
+    if ctx.author.name != ADMIN_USER: return await ctx.send("⛔ Zugriff verweigert.")
+    started = time.perf_counter()
+    known = {}     # video_id -> (título, duración) ya conocidos por la playlist de YouTube
+    entries = []
+    for attachment in ctx.message.attachments:
+        entries += importer.parse_entries((await attachment.read()).decode("utf-8", "ignore"))
+    for entry in importer.parse_entries(source):
+        if not importer.is_playlist(entry):
+            entries.append(entry)
+            continue
+        progress = await ctx.send("📥 Lese Playlist...")
+        try:
+            items = await expand_playlist(entry)
+        except Exception as e:
+            await progress.edit(content=f"❌ Playlist konnte nicht gelesen werden: {e}")
+            continue
+        for item in items:
+            if item.get("title") in importer.UNAVAILABLE_TITLES: known[item["id"]] = None
+            else: known[item["id"]] = (item.get("title"), item.get("duration"))
+            entries.append(item["id"])
+        await progress.edit(content=f"📥 Playlist: {len(items)} Einträge.")
+    if not entries: return await ctx.send("⚠️ Nichts zu importieren. URL angeben oder .txt anhängen.")
+
+    # Deduplicado por video_id, dentro del lote y contra la playlist actual
+    existing = radios.library.store.video_ids()
+    seen, todo, invalid, duplicates, present = set(), [], 0, 0, 0
+    for entry in entries:
+        vid = importer.find_video_id(entry)
+        if not vid or known.get(vid, ()) is None: invalid += 1
+        elif vid in existing: present += 1
+        elif vid in seen: duplicates += 1
+        else:
+            seen.add(vid)
+            todo.append(vid)
+
+    # Validación en paralelo (lo que ya trae título y duración de la playlist no hace falta)
+    progress = await ctx.send(f"🔎 Prüfe {len(todo)} Songs...")
+    last_edit = [0.0]
+
+    async def report(done, total):
+        if time.monotonic() - last_edit[0] > 2 or done == total:
+            last_edit[0] = time.monotonic()
+            await progress.edit(content=f"🔎 Geprüft: {done}/{total}")
+
+    async def validate(vid):
+        if known.get(vid) and known[vid][0] and known[vid][1]: return vid, known[vid][0], "ok"
+        return await check_video(vid)
+
+    results = await importer.run_batched(todo, validate, concurrency=IMPORT_CONCURRENCY, rate=IMPORT_RATE,
+                                         batch_size=IMPORT_BATCH, on_batch=report)
+    songs, unchecked = [], 0
+    for vid, title, status in results:
+        if status == "invalid":
+            invalid += 1
+            continue
+        unchecked += status == "unchecked"
+        duration = known[vid][1] if known.get(vid) else None
+        songs.append((importer.canonical_url(vid), vid, title, int(duration) if duration else None))
+
+    added = radios.add_many_to_playlist(songs)
+    for state in radios.connected(): schedule_prefetch(state)
+    await progress.edit(content=(
+        f"✅ Import fertig in {time.perf_counter() - started:.0f}s: **{len(added)}** neu, "
+        f"{present} schon vorhanden, {duplicates} doppelt, {invalid} ungültig/nicht verfügbar"
+        + (f", {unchecked} ungeprüft übernommen" if unchecked else "") + "."))
+
 @bot.command(name="list")
 async def cmd_list(ctx):
     if ctx.author.name != ADMIN_USER: return await ctx.send("⛔ Zugriff verweigert.")
-    if not state.permanent_playlist:
+    playlist = radios.library.permanent_playlist
+    if not playlist:
         return await ctx.send("📂 Die Wiedergabeliste ist leer.")
     
     # Send as file if too long
-    content = "\n".join(state.permanent_playlist)
+    content = "\n".join(playlist)
     if len(content) > 1900:
-        with open("temp_list.txt", "w") as f: f.write(content)
-        await ctx.send("📂 Wiedergabeliste:", file=discord.File("temp_list.txt"))
-        os.remove("temp_list.txt")
+        # En memoria: sin escribir/borrar un archivo temporal en el event loop
+        await ctx.send("📂 Wiedergabeliste:", file=discord.File(io.BytesIO(content.encode()), filename="playlist.txt"))
     else:
         await ctx.send(f"📂 **Wiedergabeliste**:\n```{content}```")
 
 @bot.command(name="delete")
 async def cmd_delete(ctx, *, query: str):
     if ctx.author.name != ADMIN_USER: return await ctx.send("⛔ Zugriff verweigert.")
-    removed = state.remove_from_playlist(query)
+    removed = radios.remove_from_playlist(query)
+    for state in radios.connected(): schedule_prefetch(state)
     if removed > 0:
         await ctx.send(f"🗑️ {removed} Song(s) entfernt, die '{query}' enthielten.")
     else:
@@ -434,141 +1368,267 @@ async def cmd_delete(ctx, *, query: str):
 
 @bot.command(name="skip")
 async def cmd_skip(ctx):
-    if state.active_vote: return await ctx.send("⚠️ Abstimmung läuft bereits.")
-    
+    state = radios.get(ctx.guild)
     vc = state.voice_client
-    if not vc or not vc.is_playing() or not ctx.author.voice or ctx.author.voice.channel != vc.channel:
+    listener = ctx.voice_client  # La conexión de ESTE servidor (en modo emisión, distinta de vc)
+    if not vc or not vc.is_playing() or not listener or not ctx.author.voice or ctx.author.voice.channel != listener.channel:
         return await ctx.send("⚠️ Fehler: Bot spielt nicht oder falscher Kanal.")
 
     # Admin Force Skip
     if ctx.author.name == ADMIN_USER:
-        vc.stop()
+        skip_track(state)
+        metrics.SKIPS.inc(reason="admin")
         return await ctx.send("⏭️ (Admin) Übersprungen.")
 
     # User Vote Skip
-    members = [m for m in vc.channel.members if not m.bot]
+    members = [m for m in listener.channel.members if not m.bot]
     required_votes = math.ceil(len(members) / 2)
     
     if len(members) < 2:
-        vc.stop()
+        skip_track(state)
+        metrics.SKIPS.inc(reason="user")
         return await ctx.send("⏭️ Übersprungen.")
 
-    state.active_vote = True
-    msg = await ctx.send(f"🗳️ Skip Vote! Benötigt: **{required_votes}**\nReagiere mit ⏭️ (60s).")
-    await msg.add_reaction("⏭️")
-
-    try:
-        await asyncio.sleep(60)
-        cache_msg = await ctx.channel.fetch_message(msg.id)
-        reaction = discord.utils.get(cache_msg.reactions, emoji="⏭️")
-        count = reaction.count - 1 if reaction else 0
-        state.active_vote = False
-        
-        if count >= required_votes:
-            vc.stop()
-            await ctx.send(f"✅ Skip erfolgreich ({count}/{required_votes}).")
-        else:
-            await ctx.send(f"❌ Skip gescheitert ({count}/{required_votes}).")
-    except:
-        state.active_vote = False
+    song = state.last_played
+    result = await run_vote(ctx, f"🗳️ Skip Vote! Benötigt: **{required_votes}**\nReagiere mit ⏭️ ({VOTE_TIMEOUT:.0f}s).",
+                            "⏭️", listener.channel, required_votes, ("skip", state.guild_id))
+    if result is None: return await ctx.send("⚠️ Abstimmung läuft bereits.")
+    passed, count = result
+    if passed and state.last_played != song:
+        return await ctx.send("ℹ️ Der Song ist schon vorbei.")  # No saltar la canción siguiente
+    if passed:
+        skip_track(state)
+        metrics.SKIPS.inc(reason="vote")
+        await ctx.send(f"✅ Skip erfolgreich ({count}/{required_votes}).")
+    else:
+        await ctx.send(f"❌ Skip gescheitert ({count}/{required_votes}).")
 
 @bot.command(name="coment")
 async def cmd_coment(ctx):
     if ctx.author.name != ADMIN_USER: return await ctx.send("⛔ Zugriff verweigert.")
+    state = radios.get(ctx.guild)
     await ctx.send("🔄 Erstelle Nachrichten...")
-    weather = await get_weather_text()
-    news = await get_berlin_news()
-    full_text = f"Das Wetter. {weather}. Und nun die Nachrichten. {news}. Weiter geht es mit Musik."
-    state.next_tts_message = full_text
+    state.next_tts_file = await get_bulletin()
     
-    if state.voice_client and state.voice_client.is_playing(): state.voice_client.stop()
-    elif state.voice_client: await play_next(ctx)
+    if state.voice_client and state.voice_client.is_playing(): stop_playback(state)
+    elif state.voice_client: play_next(state)
     await ctx.send("🎙️ Spezialsendung in Kürze.")
 
+@bot.command(name="quarantine")
+async def cmd_quarantine(ctx):
+    if ctx.author.name != ADMIN_USER: return await ctx.send("⛔ Zugriff verweigert.")
+    if not len(quarantine): return await ctx.send("✅ Keine Songs in Quarantäne.")
+    lines = [f"{url}  ({e['reason']}, {e['tests']} Tests)" for url, e in quarantine.entries.items()]
+    await ctx.send(f"🚧 {len(lines)} Songs in Quarantäne:",
+                   file=discord.File(io.BytesIO("\n".join(lines).encode()), filename="quarantine.txt"))
+
+@bot.command(name="profile")
+async def cmd_profile(ctx, action: str = "stop"):
+    # :profile start | stop | stalls
+    if ctx.author.name != ADMIN_USER: return await ctx.send("⛔ Zugriff verweigert.")
+    if action == "start":
+        if not profiler.start(threading.get_ident()):  # Los comandos corren en el hilo del loop
+            return await ctx.send("⚠️ Profiler läuft bereits.")
+        return await ctx.send(f"🔬 Profiler gestartet (alle {PROFILER_INTERVAL * 1000:.0f} ms). Stoppen mit `:profile stop`.")
+    if action == "stalls":
+        if not loop_watchdog.stalls: return await ctx.send("✅ Keine Blockaden des Event-Loops erfasst.")
+        report = "\n".join(f"== {datetime.datetime.fromtimestamp(at):%Y-%m-%d %H:%M:%S}  {lag * 1000:.0f} ms ==\n" + "".join(stack)
+                           for at, lag, stack in loop_watchdog.stalls)
+        return await ctx.send(f"🐢 {len(loop_watchdog.stalls)} Blockaden:",
+                              file=discord.File(io.BytesIO(report.encode()), filename="stalls.txt"))
+    report = profiler.stop()
+    if report is None: return await ctx.send("⚠️ Profiler läuft nicht. Starten mit `:profile start`.")
+    await ctx.send("🔬 Profiler-Bericht:", file=discord.File(io.BytesIO(report.encode()), filename="profile.txt"))
+
 # ---------------- VOTING SYSTEM ----------------
+votes = VoteBook()
+
+async def run_vote(ctx, text, emoji, channel, required, key):
+    # Publica la votación y espera a que se alcance el mínimo (o VOTE_TIMEOUT).
+    # Devuelve (aprobada, votos), o None si ya hay una votación con la misma clave.
+    if not votes.reserve(key): return None
+    vote = None
+    try:
+        msg = await ctx.send(text)
+        vote = votes.open(msg.id, emoji, channel.id, required, key)
+        await msg.add_reaction(emoji)
+        passed = await vote.wait(VOTE_TIMEOUT)
+        return passed, vote.count
+    finally:
+        votes.close(vote, key)
+
+@bot.event
+async def on_raw_reaction_add(payload):
+    vote = votes.get(payload.message_id, str(payload.emoji))
+    member = payload.member
+    if not vote or not member or member.bot: return
+    # Solo cuenta quien está escuchando en el canal de voz (una vez por persona)
+    if member.voice and member.voice.channel and member.voice.channel.id == vote.channel_id:
+        vote.add(member.id)
+
+@bot.event
+async def on_raw_reaction_remove(payload):
+    vote = votes.get(payload.message_id, str(payload.emoji))
+    if vote: vote.remove(payload.user_id)
+
 @bot.command(name="play")
 async def cmd_play(ctx, *, url: str):
-    if state.active_vote:
-        return await ctx.send("⚠️ Eine Abstimmung läuft bereits.")
-    
+    state = radios.get(ctx.guild)
     vc = state.voice_client
-    if not vc or not ctx.author.voice or ctx.author.voice.channel != vc.channel:
+    listener = ctx.voice_client
+    if not vc or not listener or not ctx.author.voice or ctx.author.voice.channel != listener.channel:
         return await ctx.send("⚠️ Du musst im gleichen Sprachkanal sein.")
         
-    members = [m for m in vc.channel.members if not m.bot]
+    members = [m for m in listener.channel.members if not m.bot]
     total_members = len(members)
     
     # If few people, add directly
     if total_members < 2:
         state.queue.insert(0, url)
-        if not vc.is_playing(): await play_next(ctx)
+        if not vc.is_playing(): play_next(state)
+        else: schedule_prefetch(state)
         return await ctx.send(f"✅ Akzeptiert: {url}")
 
     # Voting required
     required_votes = math.ceil(total_members / 2)
-    state.active_vote = True
-    
-    msg = await ctx.send(
+    result = await run_vote(
+        ctx,
         f"🗳️ **Abstimmung für neuen Song!**\n{url}\n"
         f"Benötigte Stimmen: **{required_votes}**\n"
-        "Reagiere mit 👍 um zuzustimmen (60s)."
-    )
-    await msg.add_reaction("👍")
-    
-    def check(reaction, user):
-        return user in members and str(reaction.emoji) == "👍" and reaction.message.id == msg.id
+        f"Reagiere mit 👍 um zuzustimmen ({VOTE_TIMEOUT:.0f}s).",
+        "👍", listener.channel, required_votes, ("play", state.guild_id, url))
+    if result is None: return await ctx.send("⚠️ Für diesen Song läuft bereits eine Abstimmung.")
+    passed, count = result
 
-    try:
-        # Wait until enough unique users react (minus bot)
-        # Simplified: Just wait 60s and count
-        await asyncio.sleep(60)
-        
-        # Refresh message to count reactions
-        cache_msg = await ctx.channel.fetch_message(msg.id)
-        reaction = discord.utils.get(cache_msg.reactions, emoji="👍")
-        count = reaction.count - 1 if reaction else 0 # Subtract bot
-        
-        state.active_vote = False
-        
-        if count >= required_votes:
-            state.queue.insert(0, url)
-            await ctx.send(f"✅ Abstimmung erfolgreich ({count}/{required_votes})! Song hinzugefügt.")
-            if not vc.is_playing(): await play_next(ctx)
-        else:
-            await ctx.send(f"❌ Abstimmung gescheitert ({count}/{required_votes}).")
-            
-    except Exception as e:
-        state.active_vote = False
-        print(f"Vote Error: {e}")
+    if passed:
+        state.queue.insert(0, url)
+        await ctx.send(f"✅ Abstimmung erfolgreich ({count}/{required_votes})! Song hinzugefügt.")
+        if not vc.is_playing(): play_next(state)
+        else: schedule_prefetch(state)
+    else:
+        await ctx.send(f"❌ Abstimmung gescheitert ({count}/{required_votes}).")
 
 # ---------------- SCHEDULER ----------------
+async def listen_to_station(vc):
+    # Modo emisión: el servidor solo se suscribe; la emisora arranca con el primer oyente
+    station = radios.station
+    vc.play(station.subscribe())
+    if not station.is_connected():
+        station.start()
+        play_next(radios.get(BROADCAST_ID))
+
+def pick_voice_channel(guild):
+    # 1. Admin, 2. Populated, 3. First
+    member = guild.get_member_named(ADMIN_USER)
+    target = member.voice.channel if member and member.voice else None
+    if not target: target = max(guild.voice_channels, key=lambda c: len(c.members), default=None)
+    if not target and guild.voice_channels: target = guild.voice_channels[0]
+    return target
+
+def anthem_targets():
+    # Todos los servidores donde ya suena la radio, a la vez. Si no hay ninguno,
+    # se auto-conecta en el primer servidor como siempre.
+    # En modo emisión basta con un servidor: el himno suena en la emisora común.
+    if BROADCAST_MODE:
+        targets = [vc.guild for vc in bot.voice_clients][:1]
+    else:
+        targets = [bot.get_guild(s.guild_id) for s in radios.connected()]
+        targets = [g for g in targets if g]
+    if not targets and bot.guilds: targets = [bot.guilds[0]]
+    return targets
+
+def anthem_midnight():
+    # La medianoche más cercana: la que viene o, si el job llega tarde, la que acaba de pasar
+    now = datetime.datetime.now(ANTHEM_TIMEZONE)
+    midnight = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time(), ANTHEM_TIMEZONE)
+    return midnight - datetime.timedelta(days=1) if midnight - now > datetime.timedelta(hours=12) else midnight
+
+async def load_assets():
+    # Decodifica a memoria los audios locales de la emisora (con su ganancia de sonoridad si ya está medida)
+    for path in ASSET_FILES:
+        if loudness: await analyse_file(path)
+        await asset_bank.load(path, gain=loudness_gain(path=path))
+
+async def arm_deutschland():
+    # ANTHEM_ARM_SECONDS antes de medianoche: voz conectada y himno en memoria. A las 00:00:00
+    # solo queda vc.play() de paquetes ya decodificados, sin ffmpeg ni conexión de por medio.
+    global anthem_armed_for
+    midnight = anthem_midnight()
+    targets = anthem_targets()
+    print(f"🇩🇪 Himno armado para {midnight:%H:%M:%S} en {len(targets)} servidor(es)")
+    anthem_armed_for = midnight.date()
+    if asset_bank: await asset_bank.load(DEUTSCHLAND_FILE, gain=loudness_gain(path=DEUTSCHLAND_FILE))
+    states = await asyncio.gather(*(anthem_connect(guild) for guild in targets), return_exceptions=True)
+    await asyncio.sleep(max(0.0, (midnight - datetime.datetime.now(ANTHEM_TIMEZONE)).total_seconds()))
+    print("🇩🇪 ZEIT FÜR DEUTSCHLAND")
+    await asyncio.gather(*(play_anthem(state) for state in states if isinstance(state, RadioState)),
+                         return_exceptions=True)
+
 async def daily_deutschland():
+    # Respaldo del cron de las 00:00: si arm_deutschland ya se encargó, no hay nada que hacer
+    if anthem_armed_for == datetime.datetime.now(ANTHEM_TIMEZONE).date(): return
     print("🇩🇪 ZEIT FÜR DEUTSCHLAND")
-    vc = state.voice_client
+    await asyncio.gather(*(deutschland_in(guild) for guild in anthem_targets()), return_exceptions=True)
+
+async def deutschland_in(guild):
+    await play_anthem(await anthem_connect(guild))
+
+async def anthem_connect(guild):
+    state = radios.get(guild)
     
     # Auto-Connect Logic
-    if not vc or not vc.is_connected():
-        guild = bot.guilds[0] if bot.guilds else None
-        if guild:
-            # 1. Admin, 2. Populated, 3. First
-            member = guild.get_member_named(ADMIN_USER)
-            target = member.voice.channel if member and member.voice else None
-            if not target: target = max(guild.voice_channels, key=lambda c: len(c.members), default=None)
-            if not target and guild.voice_channels: target = guild.voice_channels[0]
-            
-            if target:
-                try: state.voice_client = await target.connect(); vc = state.voice_client
-                except: pass
+    if not guild.voice_client or not guild.voice_client.is_connected():
+        target = pick_voice_channel(guild)
+        if target:
+            try:
+                vc = await target.connect()
+                if BROADCAST_MODE:
+                    radios.station.start()
+                    vc.play(radios.station.subscribe())
+                else:
+                    state.voice_client = vc
+            except: pass
+    return state
 
+async def play_anthem(state):
     # Strict Play
-    if vc:
-        if vc.is_playing(): vc.stop()
-        if os.path.exists(DEUTSCHLAND_FILE):
-             vc.play(discord.FFmpegPCMAudio(DEUTSCHLAND_FILE), 
-                   after=lambda e: bot.loop.create_task(play_next(None)))
+    vc = state.voice_client
+    if vc and vc.is_connected():
+        # Del banco en memoria si está cargado (arranque instantáneo); si no, ffmpeg como siempre
+        source = asset_bank.source(DEUTSCHLAND_FILE) if asset_bank else None
+        if source is None and os.path.exists(DEUTSCHLAND_FILE):
+            source = await make_source(DEUTSCHLAND_FILE, gain=loudness_gain(path=DEUTSCHLAND_FILE))
+        stop_playback(state)
+        state.gapless = None  # El himno corta la cadena gapless; play_next arrancará una nueva
+        state.current_song, state.current_track, state.audio_started = None, None, False
+        if source:
+            vc.play(source, after=lambda e: track_finished(state, e))
         else:
             print(f"⚠️ {DEUTSCHLAND_FILE} nicht gefunden!")
-            bot.loop.create_task(play_next(None))
+            play_next(state)
+
+async def quarantine_monitor():
+    # Vuelve a probar las canciones en cuarentena (sin caché) y devuelve a la rotación las que ya suenan
+    await bot.wait_until_ready()
+    metrics.QUARANTINED.set(len(quarantine))
+    while not bot.is_closed():
+        for song_url in quarantine.due(QUARANTINE_RETEST_MINUTES * 60, QUARANTINE_RETEST_BATCH):
+            try:
+                stream_url, _, _ = await resolve_stream_uncached(song_url)
+                alive = bool(stream_url) and await probe_stream_url(stream_url)
+            except YtdlQueueFull:
+                break  # YTDL saturado: la prueba no dice nada de la canción, a la próxima ronda
+            except Exception:
+                alive = False
+            if not alive:
+                quarantine.tested(song_url)
+                continue
+            quarantine.release(song_url)
+            print(f"✅ Fuera de cuarentena: {song_url}")
+            if song_url in radios.library.permanent_playlist:
+                for state in radios.all(): state.song_added(song_url)
+        metrics.QUARANTINED.set(len(quarantine))
+        await asyncio.sleep(60)
 
 async def connection_monitor():
     await bot.wait_until_ready()
@@ -576,14 +1636,64 @@ async def connection_monitor():
         # Keep alive logic here
         await asyncio.sleep(60)
 
+# ---------------- WARM-UP ----------------
+async def warm_up():
+    # Tras el login, en segundo plano: que el primer :join no pague ningún camino en frío
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    # 1. Módulos pesados diferidos, importados fuera del loop
+    await asyncio.gather(*(loop.run_in_executor(None, importlib.import_module, name)
+                           for name in ("edge_tts", "feedparser")))
+    # 2. yt-dlp: instancias y extractor de YouTube en los hilos del pool
+    ytdl_futures = [asyncio.wrap_future(f) for f in ytdl_pool.warm_up()]
+    # 3. Conexiones del pool HTTP abiertas con la mejor instancia de cada servicio
+    # (Con todos los circuitos de un grupo abiertos, ese grupo no tiene a quién calentar)
+    groups = (COBALT_INSTANCES, INVIDIOUS_INSTANCES, PIPED_INSTANCES)
+    best = [ordered[0] for ordered in map(instance_health.ordered, groups) if ordered]
+    await asyncio.gather(*(probe_instance(instance) for instance in best))
+    # 4. Primeras canciones resueltas (quedan en la precarga y en la caché de streams)
+    states = [radios.get(BROADCAST_ID)] if BROADCAST_MODE else [radios.get(g) for g in bot.guilds[:WARMUP_GUILDS]]
+    for state in states: schedule_prefetch(state)
+    await asyncio.gather(*(t for s in states for t in s.prefetch_tasks.values()), return_exceptions=True)
+    await asyncio.gather(*ytdl_futures, return_exceptions=True)
+    # 5. Primer boletín
+    await render_bulletin()
+    # 6. Himno y cuñas decodificados a memoria
+    if asset_bank: await load_assets()
+    print(f"🔥 Warm-up listo en {time.perf_counter() - started:.2f}s")
+    startup.mark("warm-up")
+    print(startup.report())
+
 @bot.event
 async def on_ready():
+    global scheduler
     print(f'✅ Eingeloggt als {bot.user}')
-    keep_alive()
-    if not scheduler.running:
-        # 00:00 CET = Europe/Berlin
-        scheduler.add_job(daily_deutschland, CronTrigger(hour=0, minute=0, timezone="Europe/Berlin"))
-        scheduler.start()
+    if scheduler: return  # Reconexión: todo ya está en marcha
+    startup.mark("login")
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
+    from apscheduler.triggers.cron import CronTrigger
+    from apscheduler.triggers.interval import IntervalTrigger
+    scheduler = AsyncIOScheduler()
+    # 00:00 CET = Europe/Berlin
+    scheduler.add_job(daily_deutschland, CronTrigger(hour=0, minute=0, timezone=ANTHEM_TIMEZONE))
+    # Armado del himno ANTHEM_ARM_SECONDS antes (p. ej. 23:59:30)
+    if 0 < ANTHEM_ARM_SECONDS < 3600:
+        arm_at = 24 * 3600 - ANTHEM_ARM_SECONDS
+        scheduler.add_job(arm_deutschland, CronTrigger(hour=arm_at // 3600, minute=arm_at % 3600 // 60,
+                                                       second=arm_at % 60, timezone=ANTHEM_TIMEZONE))
+    # El primer boletín lo renderiza warm_up()
+    scheduler.add_job(render_bulletin, IntervalTrigger(minutes=BULLETIN_REFRESH_MINUTES), max_instances=1, coalesce=True)
+    scheduler.start()
     bot.loop.create_task(connection_monitor())
+    bot.loop.create_task(instance_health_monitor())
+    bot.loop.create_task(quarantine_monitor())
+    loop_watchdog.start(asyncio.get_running_loop())
+    if audio_cache: bot.loop.create_task(audio_cache_filler())
+    if loudness: bot.loop.create_task(loudness_analyser())
+    bot.loop.create_task(warm_up())
 
-bot.run(TOKEN)
\ No newline at end of file
+if __name__ == "__main__":
+    setup_cookies()
+    keep_alive()  # Health check y /metrics antes del login
+    startup.mark("cookies+keep-alive")
+    bot.run(TOKEN)
\ No newline at end of file
@@ -0,0 +1,125 @@
+import threading
+import time
+
+import discord
+from discord import opus
+
+# Modo emisión: UNA fuente (ffmpeg + codificación Opus) por emisora, y cualquier número de
+# servidores escuchando. El Station lee la fuente a ritmo real y publica frames Opus en un
+# ring buffer; cada conexión de voz reproduce un BroadcastSource que solo copia frames.
+# Station imita la API de VoiceClient (play/stop/is_playing/is_connected) para que
+# play_next lo use igual que una conexión normal.
+
+FRAME_SECONDS = opus.Encoder.FRAME_LENGTH / 1000
+OPUS_SILENCE = b"\xf8\xff\xfe"
+
+
+class Station:
+    def __init__(self, name="station", ring_frames=250):
+        self.name = name
+        self.ring = [None] * ring_frames
+        self.seq = 0                 # Número del próximo frame a publicar
+        self.cond = threading.Condition()
+        self.source = None
+        self.after = None
+        self.encoder = None
+        self.running = False
+        self.thread = None
+
+    # --- API tipo VoiceClient ---
+    def start(self):
+        if self.running: return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name=f"broadcast-{self.name}", daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.running = False
+        self.stop()
+
+    def is_connected(self):
+        return self.running
+
+    def is_playing(self):
+        return self.source is not None
+
+    def play(self, source, *, after=None):
+        with self.cond:
+            self._finish(None, call_after=False)
+            self.source = source
+            self.after = after
+
+    def stop(self):
+        with self.cond:
+            self._finish(None)
+
+    # --- Productor ---
+    def _finish(self, error, call_after=True):
+        source, after = self.source, self.after
+        self.source = self.after = None
+        if source: source.cleanup()
+        if source and after and call_after:
+            try: after(error)
+            except Exception as e: print(f"❌ Broadcast after: {e}")
+
+    def _publish(self, frame):
+        with self.cond:
+            self.ring[self.seq % len(self.ring)] = frame
+            self.seq += 1
+            self.cond.notify_all()
+
+    def _run(self):
+        next_tick = time.perf_counter()
+        while self.running:
+            source = self.source
+            if source is None:
+                time.sleep(FRAME_SECONDS)
+                next_tick = time.perf_counter()
+                continue
+            try:
+                data = source.read()
+            except Exception as e:
+                with self.cond:
+                    if self.source is source: self._finish(e)
+                continue
+            if not data:
+                with self.cond:
+                    if self.source is source: self._finish(None)
+                continue
+            if not source.is_opus():
+                # La única codificación Opus de toda la emisora
+                if self.encoder is None: self.encoder = opus.Encoder()
+                data = self.encoder.encode(data, opus.Encoder.SAMPLES_PER_FRAME)
+            self._publish(data)
+            next_tick += FRAME_SECONDS
+            delay = next_tick - time.perf_counter()
+            if delay > 0: time.sleep(delay)
+            elif delay < -1: next_tick = time.perf_counter()  # Nos quedamos atrás: no intentar recuperar
+
+    def subscribe(self):
+        return BroadcastSource(self)
+
+
+class BroadcastSource(discord.AudioSource):
+    # Lector ligero del ring buffer; quien se une tarde empieza en el frame en directo
+    def __init__(self, station):
+        self.station = station
+        self.pos = station.seq
+
+    def is_opus(self):
+        return True
+
+    def read(self):
+        station = self.station
+        with station.cond:
+            if station.seq <= self.pos:
+                station.cond.wait(FRAME_SECONDS)
+            if station.seq - self.pos > len(station.ring):
+                self.pos = station.seq - 1  # Demasiado atrás: saltamos al directo
+            if station.seq <= self.pos:
+                # Nada nuevo (emisora en pausa entre canciones): silencio, nunca b"" para
+                # que el reproductor de discord.py no se detenga.
+                return OPUS_SILENCE
+            frame = station.ring[self.pos % len(station.ring)]
+            self.pos += 1
+            return frame
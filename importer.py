@@ -0,0 +1,68 @@
+import asyncio
+import re
+import time
+
+# Importación masiva de canciones: lectura de listas (texto o playlist de YouTube),
+# validación en paralelo con tope de concurrencia y de peticiones por segundo.
+
+VIDEO_ID = re.compile(r"(?:v=|youtu\.be/|shorts/|embed/)([A-Za-z0-9_-]{11})")
+BARE_ID = re.compile(r"^[A-Za-z0-9_-]{11}$")
+UNAVAILABLE_TITLES = {"[Deleted video]", "[Private video]", "[Unavailable video]"}
+
+
+def find_video_id(entry):
+    match = VIDEO_ID.search(entry)
+    if match: return match.group(1)
+    return entry if BARE_ID.match(entry) else None
+
+
+def canonical_url(video_id):
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+
+def parse_entries(text):
+    # Una entrada por línea (o separadas por espacios); '#' empieza un comentario
+    entries = []
+    for line in text.splitlines():
+        line = line.split("#", 1)[0].strip()
+        entries.extend(line.split())
+    return entries
+
+
+def is_playlist(url):
+    return "youtube.com/playlist" in url or ("list=" in url and "youtu" in url)
+
+
+class RateLimiter:
+    # Como mucho `rate` arranques por segundo, repartidos uniformemente
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate > 0 else 0
+        self.next_slot = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval: return
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if delay > 0: await asyncio.sleep(delay)
+
+
+async def run_batched(items, worker, concurrency=8, rate=10, batch_size=50, on_batch=None):
+    # worker(item) -> resultado; se procesa por lotes para poder informar del progreso.
+    # Devuelve los resultados en el mismo orden que items.
+    slots = asyncio.Semaphore(concurrency)
+    limiter = RateLimiter(rate)
+
+    async def limited(item):
+        async with slots:
+            await limiter.wait()
+            return await worker(item)
+
+    results = []
+    for start in range(0, len(items), batch_size):
+        batch = items[start:start + batch_size]
+        results.extend(await asyncio.gather(*(limited(item) for item in batch)))
+        if on_batch: await on_batch(len(results), len(items))
+    return results
@@ -0,0 +1,80 @@
+import json
+import os
+import time
+
+# Salud de las instancias de Piped/Invidious/Cobalt.
+# Por instancia: EWMA de latencia, EWMA de tasa de éxito y un circuit breaker
+# que se abre tras varios fallos seguidos. Se guarda en disco entre reinicios.
+
+ALPHA = 0.3              # Peso de la última medición en las EWMA
+FAILURE_THRESHOLD = 3    # Fallos seguidos para abrir el circuito
+BASE_COOLDOWN = 60       # Segundos con el circuito abierto (se duplica en cada reapertura)
+MAX_COOLDOWN = 30 * 60
+
+
+class InstanceHealth:
+    def __init__(self, path="instance_health.json"):
+        self.path = path
+        self.stats = {}
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path): return
+        try:
+            with open(self.path, "r") as f:
+                self.stats = json.load(f)
+            print(f"🩺 Salud de instancias: {len(self.stats)} instancias cargadas.")
+        except Exception as e:
+            print(f"⚠️ Salud de instancias ilegible ({e}). Empezando de cero.")
+
+    def save(self):
+        if not self.dirty: return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.stats, f)
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+    def _get(self, instance):
+        if instance not in self.stats:
+            # Instancia nueva: neutra, para que se pruebe al menos una vez
+            self.stats[instance] = {"latency": 1.0, "success": 1.0, "failures": 0, "open_until": 0, "cooldown": 0}
+        return self.stats[instance]
+
+    def score(self, instance):
+        # Menor es mejor: latencia esperada penalizada por la tasa de fallos
+        s = self._get(instance)
+        return s["latency"] / max(s["success"], 0.05)
+
+    def is_open(self, instance):
+        return self._get(instance)["open_until"] > time.time()
+
+    def ordered(self, instances):
+        # Instancias disponibles de mejor a peor; las de circuito abierto se omiten
+        available = [i for i in instances if not self.is_open(i)]
+        return sorted(available, key=self.score)
+
+    def open_instances(self, instances):
+        return [i for i in instances if self.is_open(i) or self._get(i)["failures"] >= FAILURE_THRESHOLD]
+
+    def record_success(self, instance, latency):
+        s = self._get(instance)
+        s["latency"] = (1 - ALPHA) * s["latency"] + ALPHA * latency
+        s["success"] = (1 - ALPHA) * s["success"] + ALPHA
+        s["failures"] = 0
+        s["open_until"] = 0
+        s["cooldown"] = 0
+        self.dirty = True
+
+    def record_failure(self, instance, latency=None):
+        s = self._get(instance)
+        if latency is not None:
+            s["latency"] = (1 - ALPHA) * s["latency"] + ALPHA * latency
+        s["success"] = (1 - ALPHA) * s["success"]
+        s["failures"] += 1
+        if s["failures"] >= FAILURE_THRESHOLD:
+            s["cooldown"] = min(max(s["cooldown"] * 2, BASE_COOLDOWN), MAX_COOLDOWN)
+            s["open_until"] = time.time() + s["cooldown"]
+            print(f"🔌 Circuito abierto para {instance} ({s['cooldown']}s)")
+        self.dirty = True
@@ -1,12 +1,18 @@
-from flask import Flask
+from flask import Flask, Response
 from threading import Thread
 
+import metrics
+
 app = Flask('')
 
 @app.route('/')
 def home():
     return "I am alive"
 
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 def run():
     app.run(host='0.0.0.0', port=8080)
 
@@ -0,0 +1,115 @@
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+
+# Vigilancia del event loop desde un hilo aparte.
+# - LoopWatchdog: cada `interval` s manda un ping al loop (call_soon_threadsafe) y mide cuánto
+#   tarda en atenderse. Si pasa de `threshold`, el loop está bloqueado AHORA MISMO: se copia
+#   la pila del hilo del loop, que apunta directamente al código que bloquea.
+# - SamplingProfiler: muestrea la pila del loop cada pocos ms mientras está activo y genera
+#   un informe (funciones más vistas + pilas colapsadas para flamegraph.pl / speedscope).
+
+
+def short_frame(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}"
+
+
+def thread_stack(thread_id):
+    frame = sys._current_frames().get(thread_id)
+    return traceback.format_stack(frame) if frame else []
+
+
+class LoopWatchdog:
+    def __init__(self, interval=0.1, threshold=0.2, on_lag=None, on_stall=None, max_stalls=20):
+        self.interval = interval
+        self.threshold = threshold
+        self.on_lag = on_lag          # on_lag(segundos): cada medición (desde el hilo del watchdog)
+        self.on_stall = on_stall      # on_stall(segundos, pila): cada bloqueo detectado
+        self.stalls = deque(maxlen=max_stalls)  # (time.time(), segundos, pila)
+        self.loop = None
+        self.loop_thread = None
+        self.running = False
+
+    def start(self, loop):
+        # Hay que llamarlo desde el hilo del loop
+        if self.running: return
+        self.loop = loop
+        self.loop_thread = threading.get_ident()
+        self.running = True
+        threading.Thread(target=self._run, name="loop-watchdog", daemon=True).start()
+
+    def stop(self):
+        self.running = False
+
+    def _run(self):
+        while self.running:
+            acked = threading.Event()
+            sent = time.perf_counter()
+            try:
+                self.loop.call_soon_threadsafe(acked.set)
+            except RuntimeError:
+                break  # Loop cerrado
+            stack = None
+            if not acked.wait(self.threshold):
+                stack = thread_stack(self.loop_thread)
+                while self.running and not acked.wait(1): pass
+            lag = time.perf_counter() - sent
+            if self.on_lag: self.on_lag(lag)
+            if stack:
+                self.stalls.append((time.time(), lag, stack))
+                if self.on_stall: self.on_stall(lag, stack)
+            time.sleep(self.interval)
+
+
+class SamplingProfiler:
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = Counter()   # pila colapsada "a;b;c" -> muestras
+        self.thread_id = None
+        self.started_at = None
+        self.running = False
+
+    def start(self, thread_id):
+        if self.running: return False
+        self.samples.clear()
+        self.thread_id = thread_id
+        self.started_at = time.perf_counter()
+        self.running = True
+        threading.Thread(target=self._run, name="sampling-profiler", daemon=True).start()
+        return True
+
+    def stop(self):
+        if not self.running: return None
+        self.running = False
+        return self.report()
+
+    def _run(self):
+        while self.running:
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame:
+                stack.append(short_frame(frame))
+                frame = frame.f_back
+            if stack: self.samples[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+    def report(self, top=30):
+        total = sum(self.samples.values()) or 1
+        elapsed = time.perf_counter() - self.started_at
+        own, cumulative = Counter(), Counter()
+        for stack, count in self.samples.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for frame in set(frames): cumulative[frame] += count
+        lines = [f"Perfil del event loop: {elapsed:.1f}s, {total} muestras cada {self.interval * 1000:.0f} ms", ""]
+        lines.append("== Propio (dónde está el loop) ==")
+        lines += [f"{count / total * 100:6.1f}%  {frame}" for frame, count in own.most_common(top)]
+        lines += ["", "== Acumulado (incluye llamadas) =="]
+        lines += [f"{count / total * 100:6.1f}%  {frame}" for frame, count in cumulative.most_common(top)]
+        lines += ["", "== Pilas colapsadas (flamegraph.pl / speedscope) =="]
+        lines += [f"{stack} {count}" for stack, count in self.samples.most_common()]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,93 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+
+# Índice de sonoridad EBU R128: cada pista se mide UNA vez, en segundo plano, con el filtro
+# ebur128 de ffmpeg (sonoridad integrada + true peak) y el resultado queda guardado.
+# Al reproducir basta con un filtro "volume=XdB" ya calculado: nada de loudnorm en vivo.
+# Claves: "yt:<video_id>" para canciones y "file:<sha1>" para archivos locales (TTS, himno).
+
+INTEGRATED = re.compile(r"^\s*I:\s*(-?[\d.]+|-inf) LUFS", re.MULTILINE)
+TRUE_PEAK = re.compile(r"^\s*Peak:\s*(-?[\d.]+|-inf) dBFS", re.MULTILINE)
+
+
+def song_key(video_id):
+    return f"yt:{video_id}"
+
+
+async def measure(src, before_options=(), timeout=600):
+    # (lufs, peak_dbtp) de un archivo o URL, o None. ffmpeg decodifica todo sin reproducir nada.
+    proc = await asyncio.create_subprocess_exec(
+        "ffmpeg", "-nostdin", "-hide_banner", "-nostats", *before_options, "-i", src,
+        "-vn", "-af", "ebur128=peak=true:framelog=quiet", "-f", "null", "-",
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE)
+    try:
+        _, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        proc.kill()
+        await proc.wait()
+        raise
+    if proc.returncode != 0: return None
+    output = stderr.decode(errors="replace")
+    # El resumen va al final; las últimas coincidencias son las del total
+    lufs, peak = INTEGRATED.findall(output), TRUE_PEAK.findall(output)
+    if not lufs or lufs[-1] == "-inf": return None  # Silencio o nada decodificado
+    return float(lufs[-1]), float(peak[-1]) if peak and peak[-1] != "-inf" else None
+
+
+class LoudnessIndex:
+    def __init__(self, path="loudness.json", target=-16.0, max_peak=-1.0, max_boost=10.0):
+        self.path = path
+        self.target = target        # LUFS a los que se lleva todo
+        self.max_peak = max_peak    # dBTP: una subida nunca lleva el pico por encima de esto
+        self.max_boost = max_boost  # dB: tope de subida para pistas muy bajas
+        self.entries = {}           # clave -> {"lufs", "peak", "measured"}
+        self.file_keys = {}         # ruta -> (tamaño, mtime, clave), para no re-hashear en cada play
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path): return
+        try:
+            with open(self.path, "r") as f:
+                self.entries = json.load(f)
+        except Exception as e:
+            print(f"⚠️ Índice de sonoridad ilegible ({e}). Empezando vacío.")
+            return
+        print(f"🔊 Sonoridad: {len(self.entries)} pistas medidas.")
+
+    def save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp, self.path)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def file_key(self, path):
+        # Hash del contenido: el mismo audio tiene la misma clave aunque cambie de nombre
+        stat = os.stat(path)
+        cached = self.file_keys.get(path)
+        if cached and cached[:2] == (stat.st_size, stat.st_mtime): return cached[2]
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""): digest.update(chunk)
+        key = f"file:{digest.hexdigest()[:16]}"
+        self.file_keys[path] = (stat.st_size, stat.st_mtime, key)
+        return key
+
+    def record(self, key, lufs, peak):
+        self.entries[key] = {"lufs": lufs, "peak": peak, "measured": time.time()}
+        self.save()
+
+    def gain(self, key):
+        # dB a aplicar para llegar a `target`, o None si la pista no está medida
+        entry = self.entries.get(key)
+        if not entry: return None
+        gain = min(self.target - entry["lufs"], self.max_boost)
+        if gain > 0 and entry["peak"] is not None:
+            gain = min(gain, max(self.max_peak - entry["peak"], 0.0))
+        return gain
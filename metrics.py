@@ -0,0 +1,133 @@
+import threading
+import time
+
+# Métricas en formato de texto de Prometheus, sin dependencias: contadores, gauges e
+# histogramas con etiquetas. Se actualizan desde el event loop y desde los hilos de
+# audio, así que cada métrica tiene su propio lock. keep_alive las sirve en /metrics.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            counts, total, n = self.values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound: counts[i] += 1
+            self.values[key] = (counts, total + value, n + 1)
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            for key, (counts, total, n) in sorted(self.values.items()):
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_labels(self.label_names, key, [('le', bound)])} {count}")
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, [('le', '+Inf')])} {n}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {total}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, key)} {n}")
+        return lines
+
+
+class _Timer:
+    # with histogram.time(label=...): ...  — observa los segundos transcurridos
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---------------- Métricas del bot ----------------
+RESOLVER_SECONDS = Histogram("radio_resolver_seconds", "Latencia de cada estrategia de resolución",
+                             ("strategy", "result"))
+INSTANCE_SECONDS = Histogram("radio_instance_seconds", "Latencia por instancia Cobalt/Invidious/Piped",
+                             ("instance", "result"))
+TIME_TO_FIRST_AUDIO = Histogram("radio_time_to_first_audio_seconds",
+                                "Desde elegir la pista hasta su primer frame de audio", ("kind",))
+TRACK_GAP = Histogram("radio_track_gap_seconds", "Silencio entre el fin de una pista y el inicio de la siguiente",
+                      buckets=(0.02, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10))
+TTS_RENDER_SECONDS = Histogram("radio_tts_render_seconds", "Tiempo de síntesis de un boletín TTS")
+CACHE_REQUESTS = Counter("radio_cache_requests_total", "Consultas a cachés", ("cache", "result"))
+FFMPEG_FAILURES = Counter("radio_ffmpeg_failures_total", "Fallos de ffmpeg/reproductor", ("reason",))
+SKIPS = Counter("radio_skips_total", "Canciones saltadas", ("reason",))
+LOOP_LAG_SECONDS = Histogram("radio_event_loop_lag_seconds", "Retraso del event loop",
+                             buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5))
+LOOP_STALLS = Counter("radio_event_loop_stalls_total", "Bloqueos del event loop por encima del umbral")
+LOOP_LAG_CURRENT = Gauge("radio_event_loop_lag_current_seconds", "Último retraso medido del event loop")
+STARTUP_SECONDS = Gauge("radio_startup_phase_seconds", "Duración de cada fase del arranque", ("phase",))
+TRACK_FAILURES = Counter("radio_track_failures_total", "Pistas que no llegaron a sonar", ("reason",))
+QUARANTINED = Gauge("radio_quarantined_tracks", "Canciones en cuarentena")
+STREAM_FAILOVERS = Counter("radio_stream_failovers_total", "Re-resoluciones a mitad de canción", ("reason",))
+LOUDNESS_ANALYSES = Counter("radio_loudness_analyses_total", "Mediciones EBU R128 en segundo plano", ("kind", "result"))
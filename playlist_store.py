@@ -0,0 +1,136 @@
+import os
+import sqlite3
+import time
+
+# Playlist permanente en SQLite: clave única por video_id, título/duración guardados
+# y búsqueda por subcadena con un índice FTS5 trigram (si el SQLite lo soporta).
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS songs (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    video_id TEXT UNIQUE,
+    title TEXT,
+    duration INTEGER,
+    added_at REAL,
+    plays INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS songs_fts USING fts5(
+    url, title, content='songs', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS songs_ai AFTER INSERT ON songs BEGIN
+    INSERT INTO songs_fts(rowid, url, title) VALUES (new.id, new.url, new.title);
+END;
+CREATE TRIGGER IF NOT EXISTS songs_ad AFTER DELETE ON songs BEGIN
+    INSERT INTO songs_fts(songs_fts, rowid, url, title) VALUES ('delete', old.id, old.url, old.title);
+END;
+CREATE TRIGGER IF NOT EXISTS songs_au AFTER UPDATE OF url, title ON songs BEGIN
+    INSERT INTO songs_fts(songs_fts, rowid, url, title) VALUES ('delete', old.id, old.url, old.title);
+    INSERT INTO songs_fts(rowid, url, title) VALUES (new.id, new.url, new.title);
+END;
+"""
+
+
+class PlaylistStore:
+    def __init__(self, path="playlist.db"):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+        columns = [row["name"] for row in self.conn.execute("PRAGMA table_info(songs)")]
+        if "plays" not in columns:
+            self.conn.execute("ALTER TABLE songs ADD COLUMN plays INTEGER NOT NULL DEFAULT 0")
+        # Bases antiguas: songs_au saltaba con cualquier UPDATE (también el plays + 1 de cada pick)
+        old = self.conn.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'songs_au'").fetchone()
+        if old and "UPDATE OF" not in old["sql"]:
+            self.conn.execute("DROP TRIGGER songs_au")
+        try:
+            self.conn.executescript(FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:
+            # SQLite sin FTS5/trigram: la búsqueda cae a LIKE
+            self.fts = False
+        self.conn.commit()
+
+    def migrate_from_text(self, text_file, extract_id):
+        # Importación única desde lista_canciones.txt (el archivo se deja como estaba)
+        if self.conn.execute("SELECT 1 FROM meta WHERE key = 'migrated_from_text'").fetchone(): return 0
+        if not os.path.exists(text_file): return 0
+        with open(text_file, "r") as f:
+            urls = [l.strip() for l in f.readlines() if l.strip()]
+        added = self.add_many([(url, extract_id(url)) for url in urls])
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from_text', ?)", (text_file,))
+        self.conn.commit()
+        print(f"📦 Migradas {added} canciones de {text_file} a {self.path}")
+        return added
+
+    def all_urls(self):
+        return [row["url"] for row in self.conn.execute("SELECT url FROM songs ORDER BY id")]
+
+    def video_ids(self):
+        return {row["video_id"] for row in self.conn.execute("SELECT video_id FROM songs WHERE video_id IS NOT NULL")}
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM songs").fetchone()[0]
+
+    def contains(self, url, video_id=None):
+        row = self.conn.execute("SELECT 1 FROM songs WHERE url = ? OR (video_id IS NOT NULL AND video_id = ?)",
+                                (url, video_id)).fetchone()
+        return row is not None
+
+    def add(self, url, video_id=None, title=None, duration=None):
+        # False si ya estaba (misma URL o mismo video_id)
+        cur = self.conn.execute(
+            "INSERT OR IGNORE INTO songs (url, video_id, title, duration, added_at) VALUES (?, ?, ?, ?, ?)",
+            (url, video_id, title, duration, time.time()))
+        self.conn.commit()
+        return cur.rowcount > 0
+
+    def add_many(self, songs):
+        # songs: (url, video_id[, title[, duration]]). Una sola transacción.
+        now = time.time()
+        rows = [(s[0], s[1], s[2] if len(s) > 2 else None, s[3] if len(s) > 3 else None, now) for s in songs]
+        before = self.count()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO songs (url, video_id, title, duration, added_at) VALUES (?, ?, ?, ?, ?)", rows)
+        return self.count() - before
+
+    def set_metadata(self, video_id, title=None, duration=None):
+        with self.conn:
+            self.conn.execute(
+                "UPDATE songs SET title = COALESCE(?, title), duration = COALESCE(?, duration) WHERE video_id = ?",
+                (title, duration, video_id))
+
+    def play_counts(self):
+        return {row["url"]: row["plays"] for row in self.conn.execute("SELECT url, plays FROM songs")}
+
+    def record_play(self, url):
+        with self.conn:
+            self.conn.execute("UPDATE songs SET plays = plays + 1 WHERE url = ?", (url,))
+
+    def get(self, url):
+        return self.conn.execute("SELECT * FROM songs WHERE url = ?", (url,)).fetchone()
+
+    def search(self, query):
+        # Subcadena sin distinguir mayúsculas, en URL y título
+        if self.fts and len(query) >= 3:
+            phrase = '"' + query.replace('"', '""') + '"'
+            return self.conn.execute(
+                "SELECT songs.* FROM songs_fts JOIN songs ON songs.id = songs_fts.rowid WHERE songs_fts MATCH ?",
+                (phrase,)).fetchall()
+        pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        return self.conn.execute(
+            "SELECT * FROM songs WHERE url LIKE ? ESCAPE '\\' OR title LIKE ? ESCAPE '\\'",
+            (pattern, pattern)).fetchall()
+
+    def remove(self, query):
+        # Borra las coincidencias de search() y devuelve sus URLs
+        rows = self.search(query)
+        with self.conn:
+            self.conn.executemany("DELETE FROM songs WHERE id = ?", [(row["id"],) for row in rows])
+        return [row["url"] for row in rows]
@@ -0,0 +1,69 @@
+import json
+import os
+import time
+
+# Cuarentena de canciones muertas: tras `threshold` fallos seguidos (sin resolver, ffmpeg
+# sin audio...) la canción sale de la rotación pero sigue en la playlist. Un monitor en
+# segundo plano la vuelve a probar de vez en cuando y la devuelve si ya funciona.
+
+
+class Quarantine:
+    def __init__(self, path="quarantine.json", threshold=3):
+        self.path = path
+        self.threshold = threshold
+        self.failures = {}   # url -> fallos seguidos (solo en memoria)
+        self.entries = {}    # url -> {"since", "last_test", "tests", "reason"}
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path): return
+        try:
+            with open(self.path, "r") as f:
+                self.entries = json.load(f)
+        except Exception as e:
+            print(f"⚠️ Cuarentena ilegible ({e}). Empezando vacía.")
+            return
+        if self.entries: print(f"🚧 Cuarentena: {len(self.entries)} canciones.")
+
+    def save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp, self.path)
+
+    def __contains__(self, url):
+        return url in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def record_failure(self, url, reason="unknown"):
+        # True si con este fallo la canción entra en cuarentena
+        if url in self.entries: return False
+        self.failures[url] = self.failures.get(url, 0) + 1
+        if self.failures[url] < self.threshold: return False
+        del self.failures[url]
+        now = time.time()
+        self.entries[url] = {"since": now, "last_test": now, "tests": 0, "reason": reason}
+        self.save()
+        return True
+
+    def record_success(self, url):
+        self.failures.pop(url, None)
+
+    def due(self, interval, limit):
+        # Las que llevan más de `interval` s sin probarse, las más antiguas primero
+        now = time.time()
+        ready = [(e["last_test"], url) for url, e in self.entries.items() if now - e["last_test"] >= interval]
+        return [url for _, url in sorted(ready)[:limit]]
+
+    def tested(self, url):
+        entry = self.entries.get(url)
+        if not entry: return
+        entry["last_test"] = time.time()
+        entry["tests"] += 1
+        self.save()
+
+    def release(self, url):
+        if self.entries.pop(url, None) is not None:
+            self.save()
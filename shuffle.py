@@ -0,0 +1,90 @@
+import random
+from collections import deque
+
+# Shuffle sin repeticiones en O(1) por elección.
+# - available: canciones elegibles (lista + índice para borrar con swap-remove)
+# - cooldown: las últimas `min_distance` elegidas, que aún no pueden volver a sonar
+# - plays: historial de reproducciones; las más escuchadas se aceptan con menos probabilidad
+#   (muestreo por rechazo con un número fijo de intentos, así que sigue siendo O(1))
+
+MAX_TRIES = 8
+
+
+class ShuffleBag:
+    def __init__(self, items=(), min_distance=10, history_weight=0.5, plays=None, rng=None):
+        self.min_distance = min_distance
+        self.history_weight = history_weight
+        self.rng = rng or random.Random()
+        self.available = []
+        self.pos = {}
+        self.cooldown = deque()   # (item, token) en orden de elección
+        self.cooling = {}         # item -> token de su entrada vigente en cooldown
+        self.token = 0
+        self.plays = {}
+        self.total_plays = 0
+        for item in items:
+            self.add(item, plays=(plays or {}).get(item, 0))
+
+    def __len__(self):
+        return len(self.available) + len(self.cooling)
+
+    def __contains__(self, item):
+        return item in self.pos or item in self.cooling
+
+    def add(self, item, plays=0):
+        if item in self: return
+        self.pos[item] = len(self.available)
+        self.available.append(item)
+        self.plays[item] = plays
+        self.total_plays += plays
+
+    def _take(self, item):
+        # swap-remove de available
+        idx = self.pos.pop(item)
+        last = self.available.pop()
+        if last != item:
+            self.available[idx] = last
+            self.pos[last] = idx
+
+    def remove(self, item):
+        if item in self.pos:
+            self._take(item)
+        elif item in self.cooling:
+            del self.cooling[item]  # Su entrada en el deque queda huérfana y se ignora al salir
+        else:
+            return
+        self.total_plays -= self.plays.pop(item, 0)
+
+    def _release_oldest(self):
+        while self.cooldown:
+            item, token = self.cooldown.popleft()
+            if self.cooling.get(item) == token:
+                del self.cooling[item]
+                self.pos[item] = len(self.available)
+                self.available.append(item)
+                return
+
+    def _accept(self, item):
+        if not self.history_weight or not self.total_plays: return True
+        excess = self.plays[item] - self.total_plays / len(self)
+        if excess <= 0: return True
+        return self.rng.random() < 1 / (1 + self.history_weight * excess)
+
+    def pick(self):
+        if not self.available:
+            if not self.cooling: return None
+            self._release_oldest()
+        for _ in range(MAX_TRIES):
+            item = self.available[self.rng.randrange(len(self.available))]
+            if self._accept(item): break
+        self._take(item)
+        self.token += 1
+        self.cooling[item] = self.token
+        self.cooldown.append((item, self.token))
+        self.plays[item] += 1
+        self.total_plays += 1
+        # Con playlists pequeñas la distancia se ajusta para que siempre quede algo elegible
+        window = min(self.min_distance, len(self) - 1)
+        while len(self.cooling) > window:
+            self._release_oldest()
+        return item
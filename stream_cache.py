@@ -0,0 +1,71 @@
+import json
+import os
+import re
+import time
+from urllib.parse import urlparse, parse_qs
+
+# Caché de stream URLs resueltas (video_id -> url, title, source, expires).
+# Se guarda en disco para que un reinicio en Render arranque "en caliente".
+
+DEFAULT_TTL = 30 * 60      # Si la URL no trae 'expire' (ej. túneles de Cobalt)
+EXPIRY_MARGIN = 10 * 60    # Margen para que la URL no caduque a mitad de canción
+
+
+def url_expiry(url, now=None):
+    # googlevideo lleva ?expire=<unix ts> o /expire/<unix ts>/ en la ruta
+    now = now or time.time()
+    parsed = urlparse(url)
+    values = parse_qs(parsed.query).get("expire")
+    if not values:
+        match = re.search(r"/expire/(\d+)", parsed.path)
+        values = [match.group(1)] if match else None
+    if values:
+        try: return int(values[0])
+        except ValueError: pass
+    return now + DEFAULT_TTL
+
+
+class StreamCache:
+    def __init__(self, path="stream_cache.json"):
+        self.path = path
+        self.entries = {}
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path): return
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"⚠️ Caché de streams ilegible ({e}). Empezando vacía.")
+            return
+        now = time.time()
+        self.entries = {k: v for k, v in data.items() if v.get("expires", 0) - EXPIRY_MARGIN > now}
+        print(f"💾 Caché de streams: {len(self.entries)} entradas válidas cargadas.")
+
+    def save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp, self.path)
+
+    def get(self, video_id):
+        entry = self.entries.get(video_id)
+        if not entry: return None
+        if entry["expires"] - EXPIRY_MARGIN <= time.time():
+            self.drop(video_id)
+            return None
+        return entry
+
+    def put(self, video_id, url, title, source):
+        self.entries[video_id] = {
+            "url": url,
+            "title": title,
+            "source": source,
+            "expires": url_expiry(url),
+        }
+        self.save()
+
+    def drop(self, video_id):
+        if self.entries.pop(video_id, None) is not None:
+            self.save()
@@ -0,0 +1,65 @@
+import asyncio
+
+# Votaciones por reacciones, sin sondeo: on_raw_reaction_add/remove alimentan cada Vote
+# y la votación se resuelve en cuanto llega a las necesarias (o al vencer el plazo).
+# Cada votación va ligada a su mensaje, así que puede haber varias a la vez; `key`
+# evita duplicados (p. ej. un solo skip por servidor, un solo voto por canción).
+
+
+class Vote:
+    def __init__(self, message_id, emoji, channel_id, required, key=None):
+        self.message_id = message_id
+        self.emoji = emoji
+        self.channel_id = channel_id   # Canal de voz cuyos oyentes pueden votar
+        self.required = required
+        self.key = key
+        self.voters = set()
+        self.passed = asyncio.get_running_loop().create_future()
+
+    @property
+    def count(self):
+        return len(self.voters)
+
+    def add(self, user_id):
+        self.voters.add(user_id)
+        if self.count >= self.required and not self.passed.done():
+            self.passed.set_result(True)
+
+    def remove(self, user_id):
+        self.voters.discard(user_id)
+
+    async def wait(self, timeout):
+        # True si se alcanzó el mínimo antes del plazo
+        try:
+            return await asyncio.wait_for(asyncio.shield(self.passed), timeout)
+        except asyncio.TimeoutError:
+            return False
+
+
+class VoteBook:
+    def __init__(self):
+        self.by_message = {}
+        self.by_key = {}
+
+    def reserve(self, key):
+        # Aparta la clave antes de publicar el mensaje; False si ya hay una votación igual
+        if key in self.by_key: return False
+        self.by_key[key] = None
+        return True
+
+    def open(self, message_id, emoji, channel_id, required, key=None):
+        vote = Vote(message_id, emoji, channel_id, required, key)
+        self.by_message[message_id] = vote
+        if key is not None: self.by_key[key] = vote
+        return vote
+
+    def close(self, vote=None, key=None):
+        if vote:
+            self.by_message.pop(vote.message_id, None)
+            if not vote.passed.done(): vote.passed.cancel()
+            key = vote.key
+        self.by_key.pop(key, None)
+
+    def get(self, message_id, emoji):
+        vote = self.by_message.get(message_id)
+        return vote if vote and vote.emoji == emoji else None
@@ -0,0 +1,71 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Pool dedicado para yt-dlp: hilos propios (no el executor por defecto del loop)
+# y una instancia YoutubeDL "caliente" por hilo y por proxy, para no recargar
+# extractores ni cookies.txt en cada canción.
+
+
+class YtdlQueueFull(Exception):
+    pass
+
+
+class YtdlPool:
+    def __init__(self, base_opts, workers=2, max_queue=8, timeout=30):
+        self.base_opts = base_opts
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ytdl")
+        self.local = threading.local()
+        self.slots = asyncio.Semaphore(workers)
+        self.waiting = 0
+
+    def _instance(self, proxy, extra_opts=None):
+        # YoutubeDL no es thread-safe: cada hilo tiene las suyas (una por proxy y juego de opciones)
+        instances = getattr(self.local, "instances", None)
+        if instances is None:
+            instances = self.local.instances = {}
+        key = (proxy, tuple(sorted((extra_opts or {}).items())))
+        if key not in instances:
+            import yt_dlp  # Import diferido (~0.2 s): se carga en un hilo del pool, no en el loop
+            opts = dict(self.base_opts, **(extra_opts or {}))
+            if proxy: opts["proxy"] = proxy
+            instances[key] = yt_dlp.YoutubeDL(opts)
+        return instances[key]
+
+    def _extract(self, url, proxy, download, process, extra_opts):
+        return self._instance(proxy, extra_opts).extract_info(url, download=download, process=process)
+
+    def _warm(self):
+        # Instancia sin proxy + extractor de YouTube ya construido (la primera canción no lo paga)
+        self._instance(None).get_info_extractor("Youtube")
+
+    def warm_up(self):
+        # En todos los hilos del pool. Devuelve los futures por si se quiere esperar.
+        return [self.executor.submit(self._warm) for _ in range(self.workers)]
+
+    async def extract(self, url, proxy=None, timeout=None, download=False, process=True, extra_opts=None):
+        if self.waiting >= self.max_queue:
+            raise YtdlQueueFull(f"Cola de YTDL llena ({self.waiting} en espera)")
+        self.waiting += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, self._extract, url, proxy, download, process, extra_opts)
+        # El hueco se libera cuando el hilo termina de verdad, no cuando vence el timeout:
+        # así un extract colgado no deja que se acumule trabajo detrás.
+        future.add_done_callback(self._done)
+        return await asyncio.wait_for(asyncio.shield(future), timeout or self.timeout)
+
+    def _done(self, future):
+        self.slots.release()
+        if not future.cancelled():
+            future.exception()  # Marca el error como recogido si nadie espera ya el resultado
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)